@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+# Degradation ladder applied to searches admitted under load
+FULL = 0  # fuzzy expansion as usual
+CAPPED_FUZZY = 1  # fewer fuzzy expansions per word
+EXACT_ONLY = 2  # no fuzzy expansion at all
+
+LEVEL_NAMES = {FULL: "none", CAPPED_FUZZY: "capped-fuzzy", EXACT_ONLY: "exact-only"}
+
+
+class Overloaded(Exception):
+    """The admission queue is full; the request should be shed with a 503."""
+
+
+class _Ticket:
+    """
+    A queued request; entering it waits for an execution slot.
+
+    It holds its place in the queue from ``enter()`` until it starts
+    running, or until it is abandoned without ever being entered.
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.level = FULL
+        self._started = 0.0
+        self._queued = True
+        controller.waiting += 1
+
+    def abandon(self):
+        """Give up the queue place of a ticket that never started (no-op once it has)."""
+        if self._queued:
+            self._queued = False
+            self.controller.waiting -= 1
+
+    def __del__(self):
+        # Safety net for a ticket dropped without being entered or abandoned
+        self.abandon()
+
+    async def __aenter__(self) -> "_Ticket":
+        controller = self.controller
+        try:
+            await controller._slots.acquire()
+        finally:
+            self.abandon()
+        # Decide the level when work actually starts, from the load seen then
+        self.level = controller.degradation_level()
+        controller.in_flight += 1
+        controller.admitted[self.level] += 1
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        controller = self.controller
+        controller.in_flight -= 1
+        controller._slots.release()
+        controller.latencies.append((time.perf_counter() - self._started) * 1000)
+
+
+class AdmissionController:
+    """
+    Bounded admission for search requests.
+
+    At most ``max_in_flight`` searches run at once and at most ``max_queue``
+    wait for a slot; anything beyond that is shed. The queue depth and the
+    recent p95 latency pick a degradation level, which callers map onto
+    cheaper search options.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        degrade_queue_depth: int,
+        severe_queue_depth: int,
+        degrade_p95_ms: float,
+        severe_p95_ms: float,
+        window: int = 200,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.degrade_queue_depth = degrade_queue_depth
+        self.severe_queue_depth = severe_queue_depth
+        self.degrade_p95_ms = degrade_p95_ms
+        self.severe_p95_ms = severe_p95_ms
+        self.latencies: deque = deque(maxlen=window)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.waiting = 0
+        self.in_flight = 0
+        self.shed = 0
+        self.admitted = {FULL: 0, CAPPED_FUZZY: 0, EXACT_ONLY: 0}
+
+    def p95_ms(self) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def degradation_level(self) -> int:
+        level = FULL
+        if self.waiting >= self.severe_queue_depth:
+            level = EXACT_ONLY
+        elif self.waiting >= self.degrade_queue_depth:
+            level = CAPPED_FUZZY
+
+        p95 = self.p95_ms()
+        if p95 is not None:
+            if p95 >= self.severe_p95_ms:
+                level = max(level, EXACT_ONLY)
+            elif p95 >= self.degrade_p95_ms:
+                level = max(level, CAPPED_FUZZY)
+        return level
+
+    def enter(self) -> _Ticket:
+        """
+        Ticket holding a place in the queue, or Overloaded if it is already
+        full. The place is reserved here, not when the ticket is entered, so
+        a request that only starts its work later (a streamed response) is
+        counted from the moment it is accepted; tickets that are never
+        entered must be ``abandon()``-ed.
+        """
+        if self.waiting >= self.max_queue:
+            self.shed += 1
+            raise Overloaded()
+        return _Ticket(self)
+
+    def stats(self) -> dict:
+        p95 = self.p95_ms()
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "p95_ms": round(p95, 2) if p95 is not None else None,
+            "level": LEVEL_NAMES[self.degradation_level()],
+            "shed": self.shed,
+            "admitted": {LEVEL_NAMES[k]: v for k, v in self.admitted.items()},
+        }
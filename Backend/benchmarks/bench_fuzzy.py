@@ -0,0 +1,76 @@
+"""
+Fuzzy stem matching: FuzzyIndex vs the old difflib.get_close_matches scan.
+
+For every book in the catalog, queries are the book's own stems plus one
+random single-character typo of each longer stem. Reports build time,
+mean per-lookup latency of both paths, and how often the top-5 lists are
+identical. Where they differ, difflib's extra matches are words further
+than FUZZY_MAX_DISTANCE edits away (e.g. "commun" -> "miscommun").
+
+Run from the Backend folder:  python benchmarks/bench_fuzzy.py [queries per book]
+"""
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import FUZZY_MAX_DISTANCE  # noqa: E402
+from fuzzy_index import FuzzyIndex  # noqa: E402
+from index_registry import registry  # noqa: E402
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    op = rng.choice("sid")
+    if op == "s":
+        return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+    if op == "i":
+        return word[:i] + rng.choice(LETTERS) + word[i:]
+    return word[:i] + word[i + 1:]
+
+
+def run(limit: int = 1000):
+    rng = random.Random(7)
+    registry.load_all()
+    print(f"max edit distance: {FUZZY_MAX_DISTANCE}\n")
+    print(
+        f"{'book':<10}{'stems':>7}{'build ms':>10}{'queries':>9}"
+        f"{'difflib ms':>12}{'index ms':>10}{'speedup':>9}{'same top5':>11}"
+    )
+
+    for name in registry.names():
+        vocabulary = list(registry.get(name).indexer.index.keys())
+        start = time.perf_counter()
+        fuzzy = FuzzyIndex(vocabulary, FUZZY_MAX_DISTANCE)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        queries = vocabulary + [typo(w, rng) for w in vocabulary if len(w) > 3]
+        rng.shuffle(queries)
+        queries = queries[:limit]
+
+        slow = fast = 0.0
+        same = 0
+        for query in queries:
+            start = time.perf_counter()
+            expected = difflib.get_close_matches(query, vocabulary, n=5, cutoff=0.8)
+            slow += time.perf_counter() - start
+            start = time.perf_counter()
+            got = fuzzy.close_matches(query, n=5, cutoff=0.8)
+            fast += time.perf_counter() - start
+            same += expected == got
+
+        n = len(queries)
+        print(
+            f"{name:<10}{len(vocabulary):>7}{build_ms:>10.1f}{n:>9}"
+            f"{slow / n * 1000:>12.3f}{fast / n * 1000:>10.3f}{slow / fast:>8.1f}x"
+            f"{same / n:>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
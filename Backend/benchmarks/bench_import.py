@@ -0,0 +1,60 @@
+"""
+Cold-start import cost of the query path.
+
+Each module is imported in a fresh interpreter (nothing cached in
+sys.modules), so the numbers are what a new uvicorn worker pays before it
+can serve. search_engine / runner / server are the query path; create_index
+is the build-time indexer with PyMuPDF, PyPDF2 and NLTK, shown for
+comparison. The last column lists any of those heavy libraries a module
+pulled in.
+
+Run from the Backend folder:  python benchmarks/bench_import.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+MODULES = ["search_engine", "runner", "server", "create_index"]
+HEAVY = ["nltk", "fitz", "PyPDF2"]
+REPEAT = 5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print("RESULT", elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def import_ms(module: str):
+    """Best-of-N import time in a fresh process, plus the heavy libraries it loaded."""
+    best, loaded = float("inf"), ""
+    for _ in range(REPEAT):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=BACKEND,
+            env=dict(os.environ, PYTHONWARNINGS="ignore"),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        # PyMuPDF prints its own notices on import; only the probe line counts
+        out = next(line for line in out.splitlines() if line.startswith("RESULT")).split()[1:]
+        best = min(best, float(out[0]))
+        loaded = out[1] if len(out) > 1 else ""
+    return best, loaded
+
+
+def run():
+    print(f"{'module':<16}{'import ms':>10}  heavy libraries loaded")
+    for module in MODULES:
+        ms, loaded = import_ms(module)
+        print(f"{module:<16}{ms:>10.1f}  {loaded or '-'}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+"""
+Serialization and transfer cost of real /data responses.
+
+Compares FastAPI's default path (jsonable_encoder + json.dumps) with
+responses.render_json, and the wire size / compression time of gzip and
+brotli for the same bodies.
+
+Run from the Backend folder:  python benchmarks/bench_serialization.py
+"""
+import contextlib
+import gzip
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import responses  # noqa: E402
+from runner import main  # noqa: E402
+
+QUERIES = [
+    ("risk", False),
+    ("stakeholder engagement", False),
+    ("project quality plan", False),
+    ("earned value management", True),
+    ("scope schedule cost", False),
+]
+
+
+def fastapi_default(data) -> bytes:
+    return json.dumps(
+        jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def timed(fn, *args, repeat: int = 50) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run():
+    serializer = "orjson" if responses.orjson is not None else "json (orjson not installed)"
+    print(f"render_json backend: {serializer}\n")
+    print(
+        f"{'query':<28}{'raw KB':>8}{'default ms':>12}{'fast ms':>9}"
+        f"{'gzip KB':>9}{'gzip ms':>9}{'br KB':>7}{'br ms':>7}"
+    )
+
+    for query, strict in QUERIES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = main(query, strict)
+        body = responses.render_json(data)
+
+        row = (
+            f"{query[:27]:<28}{len(body) / 1024:>8.1f}"
+            f"{timed(fastapi_default, data):>12.3f}{timed(responses.render_json, data):>9.3f}"
+            f"{len(gzip.compress(body, 6)) / 1024:>9.1f}{timed(gzip.compress, body, 6):>9.3f}"
+        )
+        if responses.brotli is not None:
+            row += (
+                f"{len(responses.brotli.compress(body, quality=5)) / 1024:>7.1f}"
+                f"{timed(lambda b: responses.brotli.compress(b, quality=5), body):>7.3f}"
+            )
+        print(row)
+
+
+if __name__ == "__main__":
+    run()
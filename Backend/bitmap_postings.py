@@ -0,0 +1,84 @@
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def to_bitmap(positions: Iterable[int]) -> int:
+    bits = 0
+    for position in positions:
+        bits |= 1 << position
+    return bits
+
+
+def bit_positions(bits: int) -> Iterator[int]:
+    """Set bits of a bitmap, lowest first."""
+    digits = bin(bits)[:1:-1]  # least significant bit first
+    position = digits.find("1")
+    while position >= 0:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+class BitmapPostings:
+    """
+    Postings as bitmaps over dense per-book section numbers.
+
+    Every section ID of a book gets an ordinal in sorted ID order, and a
+    stem's sections in that book become one Python int with those bits set.
+    AND / OR across query words and fuzzy expansions are then single
+    bitwise operations on machine words (done in C by CPython's big ints),
+    and only the final result is decoded back to section IDs — already in
+    sorted order, because the ordinals are.
+
+    A stem's bitmaps are built from ``index`` the first time it is looked
+    up, so loading a shard (and a mapped one in particular) doesn't decode
+    every postings list into a private copy up front.
+    """
+
+    def __init__(self, index: Mapping, sections: Optional[Dict[str, List[str]]] = None):
+        """
+        ``sections`` (book → sorted section IDs) reuses another instance's
+        numbering, so their bitmaps can be mixed, or a packed index's stored
+        numbering; without it the numbering is collected from ``index``.
+        """
+        if sections is None:
+            found = defaultdict(set)
+            for books in index.values():
+                for book, section_ids in books.items():
+                    found[book].update(section_ids)
+            sections = {book: sorted(ids) for book, ids in found.items()}
+        self.index = index
+        # ordinal → section ID, per book
+        self.sections: Dict[str, List[str]] = sections
+        self.ordinals: Dict[str, Dict[str, int]] = {
+            book: {sid: i for i, sid in enumerate(ids)} for book, ids in self.sections.items()
+        }
+        self.bitmaps: Dict[str, Dict[str, int]] = {}
+
+    def get(self, stem: str) -> Dict[str, int]:
+        """book → bitmap of the sections containing ``stem`` (empty if none)."""
+        bitmaps = self.bitmaps.get(stem)
+        if bitmaps is None:
+            # Racing threads build the same immutable result; either one wins
+            bitmaps = self.bitmaps[stem] = {
+                book: self.encode(book, section_ids)
+                for book, section_ids in self.index.get(stem, {}).items()
+            }
+        return bitmaps
+
+    def encode(self, book: str, section_ids: Iterable[str]) -> int:
+        """Bitmap of ``book``'s sections with these IDs."""
+        ordinals = self.ordinals[book]
+        return to_bitmap(ordinals[sid] for sid in section_ids)
+
+    def decode(self, book: str, bits: int) -> List[str]:
+        """Sorted section IDs for a bitmap of ``book``."""
+        ids = self.sections[book]
+        return [ids[position] for position in bit_positions(bits)]
+
+    def approx_bytes(self) -> int:
+        """Rough resident size: the numbering, plus ~250 bytes per bitmap built so far."""
+        size = sum(len(ids) for ids in self.sections.values()) * 160
+        for books in self.bitmaps.values():
+            size += sum(250 + bits.bit_length() // 8 for bits in books.values())
+        return size
@@ -0,0 +1,48 @@
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from config import BOOKS, BOOKS_CONFIG
+
+
+@dataclass(frozen=True)
+class BookSpec:
+    """One searchable book: where its index lives and how /data presents it."""
+
+    key: str  # response key, e.g. "PMBook"
+    index_file: str  # e.g. "book1_index.pkl"
+    final_index_file: str = ""  # e.g. "book1_fileIndex.pkl"; optional
+    name: str = ""
+    icon: str = "BookOpen"
+    color: str = "indigo"
+    # final_index page numbers + page_offset = PDF page
+    page_offset: int = 0
+
+    @property
+    def base_name(self) -> str:
+        """Shard name used throughout the index (book1_index.pkl → book1)."""
+        return self.index_file.split("_")[0]
+
+    def meta(self) -> dict:
+        """Display fields every /data response carries for this book."""
+        return {"name": self.name or self.key, "icon": self.icon, "color": self.color}
+
+
+def load_catalog(config_path: Optional[str] = BOOKS_CONFIG) -> List[BookSpec]:
+    """Book specs from PM_BOOKS_CONFIG if set, else config.BOOKS."""
+    entries = BOOKS
+    if config_path:
+        entries = json.loads(Path(config_path).read_text(encoding="utf-8"))
+
+    books = [BookSpec(**entry) for entry in entries]
+    for field in ("key", "base_name"):
+        values = [getattr(book, field) for book in books]
+        duplicates = {v for v in values if values.count(v) > 1}
+        if duplicates:
+            raise ValueError(f"Duplicate book {field} in catalog: {sorted(duplicates)}")
+    return books
+
+
+def describe(books: List[BookSpec]) -> List[dict]:
+    return [dict(asdict(book), base_name=book.base_name) for book in books]
@@ -0,0 +1,110 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Threads used to search the books of a single /data request concurrently
+SEARCH_MAX_WORKERS = _env_int("PM_SEARCH_MAX_WORKERS", min(8, (os.cpu_count() or 1) + 4))
+
+# "thread" searches books on SEARCH_MAX_WORKERS threads in the server process,
+# "process" gives every book its own long-lived worker process (see shard_pool)
+SEARCH_MODE = os.getenv("PM_SEARCH_MODE", "thread")
+
+# Serialized /data responses kept in memory, keyed on the canonical query
+QUERY_CACHE_MAX_ENTRIES = _env_int("PM_QUERY_CACHE_MAX_ENTRIES", 2048)
+QUERY_CACHE_TTL_SECONDS = _env_float("PM_QUERY_CACHE_TTL_SECONDS", 600.0)
+
+# Built offline by precompute.py; used only if it matches the loaded indexes
+PRECOMPUTED_STORE_PATH = os.getenv(
+    "PM_PRECOMPUTED_STORE", "./Data/precomputed/responses.sqlite3"
+)
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = _env_int("PM_COMPRESS_MIN_BYTES", 1024)
+# Compressed bodies kept for repeated responses, bounded by the bytes they
+# hold (original plus compressed; 0 = off)
+COMPRESS_CACHE_MAX_MB = _env_float("PM_COMPRESS_CACHE_MAX_MB", 16.0)
+
+# Upper bound on the number of queries accepted by one /data/batch call
+BATCH_MAX_QUERIES = _env_int("PM_BATCH_MAX_QUERIES", 200)
+
+# Admission control: searches running at once, and how many may wait for a slot
+# before new ones are shed with 503
+ADMISSION_MAX_IN_FLIGHT = _env_int("PM_ADMISSION_MAX_IN_FLIGHT", SEARCH_MAX_WORKERS)
+ADMISSION_MAX_QUEUE = _env_int("PM_ADMISSION_MAX_QUEUE", 64)
+
+# Queue depth / recent p95 latency at which fuzzy expansion is capped, then dropped
+DEGRADE_QUEUE_DEPTH = _env_int("PM_DEGRADE_QUEUE_DEPTH", 8)
+SEVERE_QUEUE_DEPTH = _env_int("PM_SEVERE_QUEUE_DEPTH", 32)
+DEGRADE_P95_MS = _env_float("PM_DEGRADE_P95_MS", 300.0)
+SEVERE_P95_MS = _env_float("PM_SEVERE_P95_MS", 1000.0)
+
+# "pickle" unpickles every book into each process; "mmap" maps packed copies
+# (built on first use under PACKED_INDEX_FOLDER) that all workers share
+INDEX_FORMAT = os.getenv("PM_INDEX_FORMAT", "pickle")
+PACKED_INDEX_FOLDER = os.getenv("PM_PACKED_INDEX_FOLDER", "./Data/packed")
+
+# Published index generations (see generations.py); the newest complete one is
+# served and newer ones are hot-swapped in. Checked every RELOAD_POLL_SECONDS (0 = off)
+GENERATIONS_FOLDER = os.getenv("PM_GENERATIONS_FOLDER", "./Data/generations")
+RELOAD_POLL_SECONDS = _env_float("PM_RELOAD_POLL_SECONDS", 5.0)
+
+# Books served by /data, in response order: response key, index files (looked up
+# in the index / final_index folders), display metadata and the offset between
+# final_index page numbers and PDF pages. PM_BOOKS_CONFIG may name a JSON file
+# holding the same list instead.
+BOOKS = [
+    {
+        "key": "PMBook",
+        "name": "PMBOK Guide",
+        "icon": "BookOpen",
+        "color": "indigo",
+        "index_file": "book1_index.pkl",
+        "final_index_file": "book1_fileIndex.pkl",
+        "page_offset": 80,
+    },
+    {
+        "key": "PRINCE2",
+        "name": "PRINCE 2",
+        "icon": "FileText",
+        "color": "cyan",
+        "index_file": "book2_index.pkl",
+        "final_index_file": "book2_fileIndex.pkl",
+        "page_offset": 0,
+    },
+    {
+        "key": "ISO",
+        "name": "ISO",
+        "icon": "BookOpen",
+        "color": "purple",
+        "index_file": "book3_index.pkl",
+        "final_index_file": "book3_fileIndex.pkl",
+        "page_offset": 1,
+    },
+]
+BOOKS_CONFIG = os.getenv("PM_BOOKS_CONFIG")
+
+# Book shards are loaded on first use and the least recently used ones are
+# dropped once their estimated resident size exceeds this (0 = no limit)
+BOOK_MEMORY_BUDGET_MB = _env_float("PM_BOOK_MEMORY_BUDGET_MB", 0.0)
+
+# How many catalog books (in response order) are loaded before /health/ready
+# reports ready, so the first queries don't pay for it (0 = every book); the
+# rest load on first use. /data searches every book, so fewer only helps
+# under a tight BOOK_MEMORY_BUDGET_MB
+WARM_BOOKS = _env_int("PM_WARM_BOOKS", 0)
+
+# Fuzzy matching only considers stems within this many character insertions /
+# deletions of the query stem (see fuzzy_index); larger values cost memory
+FUZZY_MAX_DISTANCE = _env_int("PM_FUZZY_MAX_DISTANCE", 2)
+
+# Largest top_k a ranked search may ask for
+RANKED_MAX_K = _env_int("PM_RANKED_MAX_K", 100)
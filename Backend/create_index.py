@@ -7,32 +7,40 @@ from pathlib import Path
 from collections import defaultdict
 from typing import Dict, List
 import PyPDF2
-import difflib
 from nltk.stem import PorterStemmer
-from collections import defaultdict
+from fields import TitleField
+from page_postings import page_index
+from positional_index import PositionalIndex
+from ranking import BM25Stats
+from search_engine import SearchEngine
+from tokens import section_text, words
 
 
 
-class PDFBookIndexer:
+class PDFBookIndexer(SearchEngine):
     """
     Creates a searchable index of PDF books organized by sections.
-    Supports fuzzy search, stemming, and multi-word queries.
+    Build-time only: the query methods are inherited from SearchEngine,
+    which the server uses directly.
     """
     
     def __init__(self):
-        self.books = {}  # {book_name: {section_id: {title, content}}}
-        self.index = defaultdict(lambda: defaultdict(list))
+        super().__init__()
         self.stemmer = PorterStemmer()
-        self.stem_lookup = {}  # maps original words → stems
+        self.page_postings = defaultdict(dict)  # {stem: {book: (PDF page, ...)}}
 
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
+    def extract_pages_from_pdf(self, pdf_path: str) -> List[str]:
+        """Text of every PDF page, in page order."""
         try:
             with open(pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                return "\n".join(page.extract_text() or "" for page in reader.pages)
+                return [page.extract_text() or "" for page in reader.pages]
         except Exception as e:
             print(f"Error reading {pdf_path}: {e}")
-            return ""
+            return []
+
+    def extract_text_from_pdf(self, pdf_path: str) -> str:
+        return "\n".join(self.extract_pages_from_pdf(pdf_path))
 
     def parse_sections(self, text: str) -> Dict[str, Dict[str, str]]:
         sections = {}
@@ -64,53 +72,35 @@ class PDFBookIndexer:
         if not book_name:
             book_name = Path(pdf_path).stem
         print(f"Processing: {book_name}...")
-        text = self.extract_text_from_pdf(pdf_path)
+        pages = self.extract_pages_from_pdf(pdf_path)
+        text = "\n".join(pages)
         if not text:
             print(f"  Warning: No text extracted from {book_name}")
             return
         sections = self.parse_sections(text)
         self.books[book_name] = sections
-        print(f"  Found {len(sections)} sections")
+        # Term → page postings, while the page boundaries are still known
+        for stem, numbers in page_index(pages, self.stemmer.stem).items():
+            self.page_postings[stem][book_name] = numbers
+        print(f"  Found {len(sections)} sections on {len(pages)} pages")
 
     def build_index(self):
         print("\nBuilding index...")
         for book_name, sections in self.books.items():
             for section_id, section_data in sections.items():
-                full_text = f"{section_data['title']} {section_data['content']}"
-                words = re.findall(r'\b[a-zA-Z]{3,}\b', full_text.lower())
-                for word in set(words):
+                for word in set(words(section_text(section_data))):
                     stem = self.stemmer.stem(word)
                     self.stem_lookup[word] = stem
                     if section_id not in self.index[stem][book_name]:
                         self.index[stem][book_name].append(section_id)
+        # Term frequencies and section lengths for BM25-ranked search
+        self.bm25 = BM25Stats.from_books(self.books, self.stemmer.stem)
+        # Token positions for phrase and NEAR/k queries
+        self.positional = PositionalIndex.from_books(self.books, self.stemmer.stem)
+        # Heading-only postings for fields=title and title boosting
+        self.title_stats = TitleField.stats_from_books(self.books, self.stemmer.stem)
         print(f"Index built with {len(self.index)} stemmed keywords")
 
-    def get_section_hierarchy_list(self, book_name: str = ""):
-        """
-        Return all sections and subsections in order as a flat list of strings.
-        Example: ["1  Introduction", "1.1  Background", "2.4  Manage by exception"]
-        """
-        if not self.books:
-            return ["No books processed yet."]
-
-        # Choose which books to process
-        books_to_process = {book_name: self.books[book_name]} if book_name else self.books
-
-        result = []
-
-        for bname, sections in books_to_process.items():
-            # Sort section IDs naturally (1, 1.1, 1.2, 2, 2.1, etc.)
-            sorted_sections = sorted(
-                sections.keys(),
-                key=lambda x: [int(n) for n in x.split(".")]
-            )
-
-            for sid in sorted_sections:
-                title = sections[sid]["title"]
-                result.append(f"{sid}  {title}")
-
-        return result
-
     def print_section_hierarchy(self, book_name: str = ""):
         """
         Print all sections and subsections in order, showing hierarchy levels.
@@ -152,7 +142,13 @@ class PDFBookIndexer:
             pickle.dump({
                 "books": self.books,
                 "index": dict(self.index),
-                "stem_lookup": self.stem_lookup
+                "stem_lookup": self.stem_lookup,
+                "term_freqs": self.bm25.term_freqs,
+                "section_lengths": self.bm25.section_lengths,
+                "positions": self.positional.positions,
+                "title_freqs": self.title_stats.term_freqs,
+                "title_lengths": self.title_stats.section_lengths,
+                "page_postings": dict(self.page_postings),
             }, f)
         print(f"✅ Saved binary index → {pkl_path.name}")
 
@@ -166,58 +162,6 @@ class PDFBookIndexer:
             json.dump(json_summary, f, indent=2)
         print(f"📄 Saved summary → {json_path.name}")
         
-    def get_all_section_ids(self):
-        """
-        Return a flat, unique, naturally sorted list of all section IDs
-        from the entire book (assuming one book in index).
-        """
-        all_ids = set()
-
-        for term, books in self.index.items():
-            for book_name, sections in books.items():
-                all_ids.update(sections)  # add all section IDs for this term
-
-        # Convert to list and sort naturally (1, 1.1, 1.2, 2, 2.1, etc.)
-        sorted_ids = sorted(
-            all_ids,
-            key=lambda x: [int(n) for n in x.split(".") if n.isdigit()]
-        )
-
-        return sorted_ids
-
-    def load_index(self, pkl_path: str):
-        """Load an existing index (.pkl file)"""
-        with open(pkl_path, "rb") as f:
-            data = pickle.load(f)
-            self.books = data["books"]
-            self.index = defaultdict(lambda: defaultdict(list), data["index"])
-            self.stem_lookup = data["stem_lookup"]
-
-    def search(self, query: str, max_results: int = 5):
-        """Search across this single index"""
-        query_words = query.lower().split()
-        results = defaultdict(list)
-
-        for word in query_words:
-            stem = self.stemmer.stem(word)
-            # Find fuzzy matches among stems
-            possible_stems = difflib.get_close_matches(stem, self.index.keys(), n=3, cutoff=0.7)
-            for ps in possible_stems:
-                for book_name, section_ids in self.index[ps].items():
-                    for sid in section_ids:
-                        title = self.books[book_name][sid]["title"]
-                        snippet = self.books[book_name][sid]["content"][:200].replace('\n', ' ')
-                        results[f"{book_name} - {sid} {title}"].append(snippet)
-
-        # Format results
-        formatted = []
-        for key, snippets in results.items():
-            formatted.append({
-                "section": key,
-                "snippets": snippets[:max_results]
-            })
-        return formatted
-
     @staticmethod
     def find_section_page(pdf_path: str, section_title: str, skip_pages: int = 0):
         """
@@ -276,134 +220,6 @@ class PDFBookIndexer:
 
         print(f"❌ Could not find '{section_title}' or any shortened version in the PDF.")
         return None, ''
-
-    @staticmethod
-    def match_sections(hierarchy_list, section_ids):
-        """
-        Match section IDs to entries in the hierarchy list.
-        Returns:
-            dict[str, dict[str, int | str]] like:
-            {
-                "10.3.1.1": {
-                    "title": "10.3.1.1  Details",
-                    "index": 3
-                }
-            }
-        """
-        matches = {}
-
-        for entry in hierarchy_list:
-            # Split "1.1  Title" → ("1.1", "Title")
-            parts = entry.split("  ", 1)
-            if len(parts) < 2:
-                continue
-            sid, title = parts
-
-            if sid in section_ids:
-                matches[sid] = {
-                    "title": entry,
-                }
-                
-        try:
-            sorted_matches = dict(
-                sorted(
-                    matches.items(),
-                    key=lambda x: [int(n) for n in x[0].split(".")]  # natural sort by numeric parts
-                )
-            )
-
-            return sorted_matches
-        except Exception:
-            return matches
-    
-    def _find_similar_keywords(self, word: str, cutoff: float = 0.8) -> List[str]:
-        """Return fuzzy-matched stems for the given word."""
-        stem = self.stemmer.stem(word)
-        return difflib.get_close_matches(stem, list(self.index.keys()), n=5, cutoff=cutoff)
-    
-    def search2(self, query: str, match_all: bool = False, fuzzy: bool = True) -> Dict[str, List[str]]:
-        """
-        Enhanced search:
-          - Multi-word queries
-          - Optional fuzzy matching
-          - Optional AND logic (match_all=True)
-        """
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', query.lower())
-        all_results = defaultdict(set)
-
-        for word in words:
-            stems_to_search = [self.stemmer.stem(word)]
-            
-            if fuzzy:
-                stems_to_search.extend(self._find_similar_keywords(word))
-
-            word_results = defaultdict(set)
-            for stem in stems_to_search:
-                for book, sections in self.index.get(stem, {}).items():
-                    word_results[book].update(sections)
-
-
-            if not all_results:
-                all_results = word_results
-                
-            
-            else:
-                # Merge results
-                for book in list(all_results.keys()):
-                    if match_all:
-                        all_results[book] &= word_results.get(book, set())  # AND
-                    else:
-                        all_results[book] |= word_results.get(book, set())  # OR
-
-        # Convert sets to sorted lists
-        data =  {b: sorted(list(s)) for b, s in all_results.items() if s}
-        # print(len(data["book1"]))
-        # print(data)
-        return data
-
-    @staticmethod
-    def return_hierarchy(data:List):
-        parent_map = defaultdict(list)
-
-        # First pass: Group by 2-level prefix
-        for item in data:
-            parts = item.split(".")
-            if len(parts) >= 2:
-                parent_key = ".".join(parts[:2])
-            else:
-                parent_key = item  # e.g. '70'
-
-            parent_map[parent_key].append(item)
-
-        # Ensure each parent exists even if it has no children
-        for item in data:
-            parts = item.split(".")
-            if len(parts) == 2:
-                parent_key = item
-                parent_map[parent_key]  # triggers defaultdict
-
-        # Convert to dict if needed
-        result = dict(parent_map)
-        return result
-    
-    def display_search_results(self, query: str, **kwargs):
-        results = self.search2(query, **kwargs)
-        print(f"\n{'='*80}")
-        print(f"Search Results for: '{query}'")
-        print(f"{'='*80}\n")
-
-        if not results:
-            print("No results found.")
-            return
-
-        for book, sections in results.items():
-            # print("Result",len(results))
-            
-            print(f"\n📘 {book}")
-        #     for sid in sorted(sections, key=lambda x: [int(n) for n in x.split('.')]):
-        #         title = self.books[book].get(sid, {}).get('title', 'Unknown')
-        #         print(f"   • Section {sid}: {title}")
-        # print(f"\n{'='*80}\n")
 # ---------------------------
 # 🧭 Main runner script
 # ---------------------------
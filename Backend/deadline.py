@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Optional, Set
+
+
+class Deadline:
+    """
+    Cooperative stop signal for one search request.
+
+    Searches poll ``expired()`` between books and between query terms, so work
+    stops once the time budget is spent or the client has gone away. Whoever
+    stops early records the affected book in ``truncated``; their partial
+    results only contain sections that are already known to match.
+
+    ``at`` is a ``time.monotonic()`` timestamp, which is comparable across
+    processes on one machine, so shard workers can check it too. Client
+    disconnects are only seen in the server process.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, at: Optional[float] = None, request=None):
+        self.at = at
+        self.request = request
+        self.cancelled = False
+        self.disconnected = False
+        self.truncated: Set[str] = set()
+
+    @classmethod
+    def after_ms(cls, budget_ms, request=None) -> "Deadline":
+        """Deadline ``budget_ms`` from now; no time limit if it is missing or invalid."""
+        try:
+            budget_ms = float(budget_ms)
+        except (TypeError, ValueError):
+            budget_ms = 0
+        at = time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+        return cls(at, request)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def expired(self) -> bool:
+        return self.cancelled or (self.at is not None and time.monotonic() >= self.at)
+
+    async def watch(self):
+        """Return once the deadline passes or the client disconnects."""
+        while not self.expired():
+            if self.request is not None and await self.request.is_disconnected():
+                self.disconnected = True
+                self.cancel()
+                return
+            remaining = self.POLL_SECONDS
+            if self.at is not None:
+                remaining = min(remaining, max(self.at - time.monotonic(), 0))
+            await asyncio.sleep(remaining)
@@ -0,0 +1,66 @@
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+
+from bitmap_postings import BitmapPostings
+from fuzzy_index import FuzzyIndex
+from ranking import BM25Stats
+
+ALL = "all"  # title and body together (the classic index)
+TITLE = "title"  # section headings only
+FIELDS = (ALL, TITLE)
+
+
+class _SectionIds(Mapping):
+    """``stem → {book: [section id, ...]}`` view of term frequencies, for BitmapPostings."""
+
+    def __init__(self, term_freqs: Mapping):
+        self.term_freqs = term_freqs
+
+    def __getitem__(self, stem: str) -> Dict[str, List[str]]:
+        return {book: list(freqs) for book, freqs in self.term_freqs[stem].items()}
+
+    def __iter__(self):
+        return iter(self.term_freqs)
+
+    def __len__(self) -> int:
+        return len(self.term_freqs)
+
+
+class TitleField:
+    """
+    Title-only postings of one index.
+
+    Headings are a few words per section, so this vocabulary and its
+    bitmaps are a small fraction of the full index: ``fields=title``
+    queries look up and fuzzy-match against just these. Bitmaps share the
+    full index's section numbering, so they combine with its bitmaps.
+    The title term frequencies / lengths double as the BM25 statistics
+    for title boosting; bitmaps and the fuzzy index are derived from them
+    on demand, so packed shards can serve the mapped frequencies as is.
+    """
+
+    def __init__(self, stats: BM25Stats, sections: Dict[str, List[str]], max_distance: int):
+        self.bm25 = stats
+        self.postings = BitmapPostings(_SectionIds(stats.term_freqs), sections)
+        self.max_distance = max_distance
+        self._fuzzy: Optional[FuzzyIndex] = None
+
+    @property
+    def fuzzy(self) -> FuzzyIndex:
+        """Candidate index over the title vocabulary, built on the first fuzzy title lookup."""
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyIndex(self.bm25.term_freqs.keys(), self.max_distance)
+        return self._fuzzy
+
+    @staticmethod
+    def stats_from_books(books: Mapping, stem: Callable[[str], str]) -> BM25Stats:
+        """Title term frequencies / lengths, tokenized like build_index tokenizes titles."""
+        titles = {
+            book: {sid: {"title": section["title"], "content": ""} for sid, section in sections.items()}
+            for book, sections in books.items()
+        }
+        return BM25Stats.from_books(titles, stem)
+
+    def title_length(self, book: str, sid: str) -> int:
+        """Tokens in the section's heading; they come first in its position stream."""
+        return self.bm25.section_lengths.get(book, {}).get(sid, 0)
@@ -0,0 +1,89 @@
+import heapq
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    """Every string reachable from word by removing up to max_distance characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def build_buckets(words: Sequence[str], max_distance: int) -> Dict[str, Tuple[int, ...]]:
+    """variant → positions in ``words`` of the stems it is a delete of."""
+    buckets = defaultdict(list)
+    for position, word in enumerate(words):
+        for variant in _deletes(word, max_distance):
+            buckets[variant].append(position)
+    # Most variants belong to a single stem; tuples keep that cheap
+    return {variant: tuple(positions) for variant, positions in buckets.items()}
+
+
+class FuzzyIndex:
+    """
+    Symmetric-delete (SymSpell-style) candidate index over a vocabulary.
+
+    Every stem is stored under all its variants with up to ``max_distance``
+    characters deleted. Two words within that many insertions/deletions
+    (so any substitution or transposition within the bound too) share a
+    variant, so a lookup only generates the query's own deletes and reads
+    their buckets instead of scanning the whole vocabulary.
+
+    Candidates are then scored with difflib's ratio and ranked exactly like
+    ``difflib.get_close_matches`` (score, then word, both descending), so
+    results are the difflib matches that lie within the edit bound.
+
+    Packed indexes store the buckets in the mapped file (``from_buckets``),
+    so workers share them instead of each building a private copy.
+    """
+
+    def __init__(self, vocabulary: Iterable[str], max_distance: int = 2):
+        self.max_distance = max_distance
+        self.words: Sequence[str] = list(vocabulary)
+        self.buckets: Mapping[str, Sequence[int]] = build_buckets(self.words, max_distance)
+        self.shared = False
+
+    @classmethod
+    def from_buckets(cls, words: Sequence[str], buckets: Mapping[str, Sequence[int]], max_distance: int) -> "FuzzyIndex":
+        """Wrap prebuilt buckets (a packed index's mapped ones) without rebuilding them."""
+        index = cls.__new__(cls)
+        index.max_distance = max_distance
+        index.words = words
+        index.buckets = buckets
+        index.shared = True
+        return index
+
+    def approx_bytes(self) -> int:
+        """Rough private size of the buckets (measured ~130 bytes per variant); 0 when mapped."""
+        return 0 if self.shared else 130 * len(self.buckets)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def candidates(self, word: str) -> set:
+        found = set()
+        for variant in _deletes(word, self.max_distance):
+            found.update(self.buckets.get(variant, ()))
+        return {self.words[position] for position in found}
+
+    def close_matches(self, word: str, n: int = 5, cutoff: float = 0.8) -> List[str]:
+        """Drop-in for ``difflib.get_close_matches(word, vocabulary, n, cutoff)``."""
+        if n <= 0:
+            return []
+        scored = []
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        for candidate in self.candidates(word):
+            matcher.set_seq1(candidate)
+            if (
+                matcher.real_quick_ratio() >= cutoff
+                and matcher.quick_ratio() >= cutoff
+                and matcher.ratio() >= cutoff
+            ):
+                scored.append((matcher.ratio(), candidate))
+        return [candidate for _, candidate in heapq.nlargest(n, scored)]
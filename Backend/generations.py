@@ -0,0 +1,101 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+# Written last by publish(); a generation directory without it is incomplete
+READY_MARKER = "READY"
+
+
+def latest_generation(generations_folder: Path) -> Optional[Path]:
+    """Newest published generation directory, or None if there is none yet."""
+    generations_folder = Path(generations_folder)
+    if not generations_folder.is_dir():
+        return None
+    published = [
+        path
+        for path in generations_folder.iterdir()
+        if path.is_dir() and (path / READY_MARKER).exists()
+    ]
+    # Names are UTC timestamps, so lexical order is publish order
+    return max(published, key=lambda path: path.name, default=None)
+
+
+def publish(
+    index_folder: Path,
+    final_index_folder: Path,
+    generations_folder: Path,
+) -> Path:
+    """
+    Copy a freshly built ``index`` + ``final_index`` pair into a new,
+    versioned generation directory that a running server will pick up.
+
+    Layout: ``<generations_folder>/<UTC timestamp>/{index,final_index}/*.pkl``.
+    Files are copied into a temporary directory that is renamed into place
+    and then marked READY, so the server never sees a half-written generation.
+    """
+    index_folder, final_index_folder = Path(index_folder), Path(final_index_folder)
+    pkl_files = sorted(index_folder.glob("*.pkl"))
+    if not pkl_files:
+        raise FileNotFoundError(f"No .pkl index files in '{index_folder}'")
+
+    generations_folder = Path(generations_folder)
+    generations_folder.mkdir(parents=True, exist_ok=True)
+    name = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    target = generations_folder / name
+    suffix = 1
+    while target.exists():
+        target = generations_folder / f"{name}-{suffix}"
+        suffix += 1
+
+    staging = generations_folder / f".{target.name}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    (staging / "index").mkdir(parents=True)
+    (staging / "final_index").mkdir()
+    for pkl_file in pkl_files:
+        shutil.copy2(pkl_file, staging / "index" / pkl_file.name)
+    for pkl_file in sorted(final_index_folder.glob("*_fileIndex.pkl")):
+        shutil.copy2(pkl_file, staging / "final_index" / pkl_file.name)
+
+    staging.rename(target)
+    (target / READY_MARKER).touch()
+    return target
+
+
+def prune(generations_folder: Path, keep: int = 3):
+    """Delete all but the newest ``keep`` published generations."""
+    generations_folder = Path(generations_folder)
+    keep = max(keep, 1)  # never remove the generation being served
+    published = sorted(
+        (p for p in generations_folder.iterdir() if (p / READY_MARKER).exists()),
+        key=lambda p: p.name,
+    )
+    for path in published[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"🗑️ Removed generation {path.name}")
+
+
+def main():
+    """
+    python generations.py publish [index_folder] [final_index_folder]
+    python generations.py prune [keep]
+    """
+    from config import GENERATIONS_FOLDER
+    from index_registry import FINAL_INDEX_FOLDER, INDEX_FOLDER
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "publish"
+    if command == "publish":
+        index_folder = Path(sys.argv[2]) if len(sys.argv) > 2 else INDEX_FOLDER
+        final_index_folder = Path(sys.argv[3]) if len(sys.argv) > 3 else FINAL_INDEX_FOLDER
+        target = publish(index_folder, final_index_folder, GENERATIONS_FOLDER)
+        print(f"✅ Published index generation → {target}")
+    elif command == "prune":
+        prune(GENERATIONS_FOLDER, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+    else:
+        print(main.__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
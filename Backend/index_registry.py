@@ -0,0 +1,392 @@
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from book_catalog import BookSpec, load_catalog
+from config import (
+    BOOK_MEMORY_BUDGET_MB,
+    GENERATIONS_FOLDER,
+    INDEX_FORMAT,
+    PACKED_INDEX_FOLDER,
+)
+from search_engine import SearchEngine
+from generations import latest_generation
+from packed_index import open_packed, source_fingerprint
+
+
+# Bump when search semantics change so generation-keyed caches and
+# precomputed responses built by older code are invalidated
+ENGINE_VERSION = "3"
+
+INDEX_FOLDER = Path("./Data/index")
+FINAL_INDEX_FOLDER = Path("./Data/final_index")
+
+# Unpickled dicts/lists take roughly this many times their pickle size in RAM
+PICKLE_EXPANSION = 5
+
+
+@dataclass
+class BookShard:
+    """One book's search index plus its section → page/title lookup."""
+
+    name: str  # e.g. "book1"
+    indexer: SearchEngine
+    key: str = ""  # response key, e.g. "PMBook"
+    final_index: Dict[str, dict] = field(default_factory=dict)
+    fingerprint: str = ""
+    source: Optional[Path] = None
+    page_offset: int = 0
+    # Estimated private memory held by this shard, for the LRU budget
+    resident_bytes: int = 0
+
+
+def book_paths(
+    spec: BookSpec, index_folder: Path, final_index_folder: Path
+) -> Tuple[Path, Optional[Path]]:
+    final_index_path = None
+    if spec.final_index_file:
+        final_index_path = Path(final_index_folder) / spec.final_index_file
+    return Path(index_folder) / spec.index_file, final_index_path
+
+
+def book_fingerprint(index_path: Path, final_index_path: Optional[Path]) -> str:
+    """The fingerprint load_shard will report, without unpickling anything."""
+    final_raw = None
+    if final_index_path is not None and final_index_path.exists():
+        final_raw = final_index_path.read_bytes()
+    return source_fingerprint(index_path.read_bytes(), final_raw)
+
+
+def load_shard(
+    spec: BookSpec,
+    index_folder: Path = INDEX_FOLDER,
+    final_index_folder: Path = FINAL_INDEX_FOLDER,
+    packed_folder: Optional[Path] = None,
+) -> BookShard:
+    """
+    Load one book's index and final_index, fingerprinting the raw bytes.
+
+    With ``packed_folder`` the index is memory-mapped from its packed copy
+    (see packed_index) instead of being unpickled into this process.
+    """
+    pkl_file, final_index_path = book_paths(spec, index_folder, final_index_folder)
+    final_raw = None
+    if final_index_path is not None and final_index_path.exists():
+        final_raw = final_index_path.read_bytes()
+    final_index = pickle.loads(final_raw) if final_raw is not None else {}
+
+    indexer = SearchEngine()
+    if packed_folder is not None:
+        packed = open_packed(pkl_file, final_index_path, packed_folder)
+        indexer.load_mapped(packed)
+        fingerprint = packed.fingerprint
+        # Mapped pages are shared, reclaimable page cache
+        resident_bytes = len(final_raw or b"") * PICKLE_EXPANSION
+    else:
+        raw = pkl_file.read_bytes()
+        indexer.load_data(pickle.loads(raw))
+        fingerprint = source_fingerprint(raw, final_raw)
+        resident_bytes = (len(raw) + len(final_raw or b"")) * PICKLE_EXPANSION
+    # Private, per-process query structures (mapped fuzzy buckets count as 0)
+    resident_bytes += indexer.fuzzy.approx_bytes() + indexer.postings.approx_bytes()
+
+    return BookShard(
+        name=spec.base_name,
+        indexer=indexer,
+        key=spec.key,
+        final_index=final_index,
+        fingerprint=fingerprint,
+        source=pkl_file,
+        page_offset=spec.page_offset,
+        resident_bytes=resident_bytes,
+    )
+
+
+class ShardCache:
+    """
+    Book shards loaded on first use and kept in LRU order.
+
+    When the loaded shards' estimated size exceeds ``budget_bytes`` the least
+    recently used ones are dropped (the one just requested always stays).
+    Requests still holding a dropped shard keep it alive until they finish.
+    """
+
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes
+        self._shards: "OrderedDict[str, BookShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name: str, loader) -> BookShard:
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is not None:
+                self._shards.move_to_end(name)
+                return shard
+            book_lock = self._loading.setdefault(name, threading.Lock())
+
+        # One loader per book; other books keep loading in parallel
+        with book_lock:
+            with self._lock:
+                shard = self._shards.get(name)
+            if shard is None:
+                shard = loader()
+                with self._lock:
+                    self.loads += 1
+                    self._shards[name] = shard
+                    self._evict(keep=name)
+            return shard
+
+    def _evict(self, keep: str):
+        while self.budget_bytes and self.resident_bytes() > self.budget_bytes:
+            oldest = next(iter(self._shards))
+            if oldest == keep:
+                break
+            del self._shards[oldest]
+            self.evictions += 1
+            print(f"♻️ Evicted book shard {oldest} (memory budget)")
+
+    def resident_bytes(self) -> int:
+        return sum(shard.resident_bytes for shard in self._shards.values())
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded(),
+            "resident_mb": round(self.resident_bytes() / 2**20, 2),
+            "budget_mb": round(self.budget_bytes / 2**20, 2) if self.budget_bytes else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass
+class IndexGeneration:
+    """
+    One immutable set of book shards, as described by the book catalog.
+
+    Requests pin the generation that was current when they started and read
+    every shard from it, so a hot reload never mixes two index versions in
+    one response; the old generation is freed once nothing references it.
+    Fingerprints are taken up front; the shards themselves load lazily.
+    """
+
+    books: List[BookSpec]
+    fingerprints: Dict[str, str]
+    generation: str
+    index_folder: Path
+    final_index_folder: Path
+    packed_folder: Optional[Path] = None
+    label: str = ""  # generation directory name, or "" for the legacy folders
+    shards: ShardCache = field(default_factory=ShardCache)
+
+    ready = True
+
+    def names(self) -> List[str]:
+        return [book.base_name for book in self.books]
+
+    def spec(self, name: str) -> BookSpec:
+        return next(book for book in self.books if book.base_name == name)
+
+    def get(self, name: str) -> BookShard:
+        """The shard for ``name``, loading it now if needed (blocking)."""
+        return self.shards.get(name, lambda: self.load(name))
+
+    def load(self, name: str) -> BookShard:
+        """Load ``name`` without keeping it in the shard cache; it is freed with the result."""
+        return load_shard(
+            self.spec(name), self.index_folder, self.final_index_folder, self.packed_folder
+        )
+
+    def status(self) -> dict:
+        return {
+            "ready": True,
+            "generation": self.generation,
+            "books": self.names(),
+            "source": self.label or str(self.index_folder),
+            "shards": self.shards.stats(),
+        }
+
+
+class IndexRegistry:
+    """
+    Serves the books listed in the book catalog (config.BOOKS).
+
+    ``load_all`` resolves the catalog against the ``Data/index`` and
+    ``Data/final_index`` folders and fingerprints every file; each book is
+    unpickled (or mapped) the first time a search needs it. ``ready`` flips
+    to True once the catalog resolves.
+
+    With a ``generations_folder``, books come from the newest published
+    generation directory instead (see generations.py), and ``load_newer()``
+    prepares a newer one to hot-swap without a restart.
+    """
+
+    def __init__(
+        self,
+        index_folder: Path = INDEX_FOLDER,
+        final_index_folder: Path = FINAL_INDEX_FOLDER,
+        packed_folder: Optional[Path] = None,
+        generations_folder: Optional[Path] = None,
+        books: Optional[List[BookSpec]] = None,
+        memory_budget_bytes: int = 0,
+    ):
+        self.index_folder = Path(index_folder)
+        self.final_index_folder = Path(final_index_folder)
+        # Set → books are memory-mapped from packed files shared by all workers
+        self.packed_folder = Path(packed_folder) if packed_folder else None
+        self.generations_folder = Path(generations_folder) if generations_folder else None
+        self.books = books if books is not None else load_catalog()
+        self.memory_budget_bytes = memory_budget_bytes
+        self.current: Optional[IndexGeneration] = None
+        self.rejected: Dict[str, str] = {}  # generation label → why it was not swapped in
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def generation(self) -> str:
+        return self.current.generation if self.current else ""
+
+    def snapshot(self) -> IndexGeneration:
+        """The generation a request should use from start to finish."""
+        return self.current
+
+    def source(self) -> Tuple[Path, Path, str]:
+        """(index folder, final_index folder, label) of the newest available books."""
+        if self.generations_folder is not None:
+            newest = latest_generation(self.generations_folder)
+            if newest is not None:
+                return newest / "index", newest / "final_index", newest.name
+        return self.index_folder, self.final_index_folder, ""
+
+    def packed_folder_for(self, index_folder: Path, label: str) -> Optional[Path]:
+        if self.packed_folder is not None and label:
+            # Packed copies live (and get pruned) with their generation
+            return Path(index_folder).parent / "packed"
+        return self.packed_folder
+
+    def source_files(self) -> List[Tuple[Path, Optional[Path], Optional[Path]]]:
+        """(index file, final_index file, packed folder) per catalogued book."""
+        index_folder, final_index_folder, label = self.source()
+        packed_folder = self.packed_folder_for(index_folder, label)
+        return [
+            book_paths(book, index_folder, final_index_folder) + (packed_folder,)
+            for book in self.books
+        ]
+
+    def load_generation(
+        self, index_folder: Path, final_index_folder: Path, label: str = ""
+    ) -> IndexGeneration:
+        """Resolve and fingerprint every catalogued book of one source, without making it current."""
+        fingerprints = {}
+        for book in self.books:
+            index_path, final_index_path = book_paths(book, index_folder, final_index_folder)
+            if not index_path.exists():
+                raise FileNotFoundError(f"Index file '{index_path}' for {book.key} not found.")
+            fingerprints[book.base_name] = book_fingerprint(index_path, final_index_path)
+
+        return IndexGeneration(
+            books=list(self.books),
+            fingerprints=fingerprints,
+            generation=self._compute_generation(self.books, fingerprints),
+            index_folder=Path(index_folder),
+            final_index_folder=Path(final_index_folder),
+            packed_folder=self.packed_folder_for(index_folder, label),
+            label=label,
+            shards=ShardCache(self.memory_budget_bytes),
+        )
+
+    @staticmethod
+    def validate(candidate: IndexGeneration):
+        """
+        Raise ValueError unless every book loads and answers a search.
+
+        Each book is loaded on its own and dropped again, outside the
+        candidate's ShardCache: with process workers the parent never
+        serves from it, and one shard at a time bounds the extra memory.
+        """
+        if not candidate.books:
+            raise ValueError("no books in the catalog")
+        for name in candidate.names():
+            shard = candidate.load(name)
+            if shard.fingerprint != candidate.fingerprints[name]:
+                raise ValueError(f"{name} changed while it was being loaded")
+            if not len(shard.indexer.index):
+                raise ValueError(f"{name} has an empty index")
+            # Canary: one real lookup through the same path /data uses
+            probe = next(iter(shard.indexer.index))
+            shard.indexer.search2(probe, fuzzy=False)
+
+    def swap(self, candidate: IndexGeneration):
+        # A single reference assignment: requests see either the old or the new set
+        self.current = candidate
+        self._ready.set()
+
+    def load_all(self) -> "IndexRegistry":
+        """Resolve the catalog for the newest source; safe to call more than once."""
+        with self._lock:
+            if self.ready:
+                return self
+
+            self.swap(self.load_generation(*self.source()))
+            print(f"✅ Book catalog ready → {', '.join(self.names())} (generation {self.generation})")
+            return self
+
+    def load_newer(self) -> Optional[IndexGeneration]:
+        """
+        Load and validate the newest published generation if it isn't the
+        current one. Does not swap; returns None when there is nothing new.
+        """
+        index_folder, final_index_folder, label = self.source()
+        if self.current is None or label in self.rejected:
+            return None
+        if index_folder == self.current.index_folder:
+            return None
+        try:
+            candidate = self.load_generation(index_folder, final_index_folder, label)
+            self.validate(candidate)
+        except Exception as e:
+            self.rejected[label] = str(e)
+            print(f"⚠️ Rejected index generation {label}: {e}")
+            return None
+        return candidate
+
+    @staticmethod
+    def _compute_generation(books: List[BookSpec], fingerprints: Dict[str, str]) -> str:
+        # Catalog fields (keys, metadata, page offsets) shape responses too
+        digest = hashlib.sha256(f"engine:{ENGINE_VERSION};".encode())
+        for book in books:
+            digest.update(f"{book!r}:{fingerprints[book.base_name]};".encode())
+        return digest.hexdigest()[:16]
+
+    def names(self) -> List[str]:
+        return self.current.names() if self.current else []
+
+    def get(self, name: str) -> BookShard:
+        return self.current.get(name)
+
+    def status(self) -> dict:
+        if self.current is None:
+            return {"ready": False, "generation": "", "books": []}
+        return dict(self.current.status(), ready=self.ready)
+
+
+# Shared by the FastAPI app and runner.main
+registry = IndexRegistry(
+    packed_folder=PACKED_INDEX_FOLDER if INDEX_FORMAT == "mmap" else None,
+    generations_folder=GENERATIONS_FOLDER,
+    memory_budget_bytes=int(BOOK_MEMORY_BUDGET_MB * 2**20),
+)
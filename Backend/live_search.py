@@ -0,0 +1,162 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Dict, List
+
+from fields import ALL
+from index_registry import IndexRegistry
+from query_planner import is_boolean
+from query_syntax import Clause
+from runner import (
+    SearchOptions,
+    book_targets,
+    new_structure,
+    present_sections,
+    query_indexer,
+    search_executor,
+    search_named_book,
+    searched_targets,
+)
+
+# {book name inside the index: section bitmap} for one book shard
+BookSets = Dict[str, int]
+
+
+class LiveSearchSession:
+    """
+    Per-connection state for search-as-you-type.
+
+    For every stem of the current query it keeps each shard's matching
+    sections (as bitmaps), and for every query prefix the running AND / OR of them.
+    When the user types another word only that word is looked up; when a word
+    is edited, the prefix before it is reused and only the tail is recombined.
+    Lookups expand words with the session's fuzzy settings, so the memo is
+    only valid for those.
+    """
+
+    def __init__(
+        self,
+        index_registry: IndexRegistry,
+        memo_size: int = 64,
+        books: tuple = (),
+        fields: str = ALL,
+        fuzzy: bool = True,
+        max_expansions: int = 5,
+    ):
+        self.index_registry = index_registry
+        self.books = books
+        self.fields = fields
+        self.fuzzy = fuzzy
+        self.max_expansions = max_expansions
+        self.targets = book_targets(index_registry, books)
+        self.memo_size = memo_size
+        self.stems: List[Clause] = []
+        self.match_all = False
+        # stem (or clause) → base_name → bitmaps; bounded so a long session can't grow forever
+        self._stem_sets: "OrderedDict[Clause, Dict[str, BookSets]]" = OrderedDict()
+        # prefix[i][base_name] = combination of stems[: i + 1]
+        self._prefix: List[Dict[str, BookSets]] = []
+
+    def _canonical_stems(self, query: str) -> List[Clause]:
+        # Plain words are stems; quoted phrases / NEAR pairs are memoized as whole clauses
+        return list(dict.fromkeys(query_indexer.parse(query or "")))
+
+    async def _lookup(self, stem: Clause) -> Dict[str, BookSets]:
+        if stem in self._stem_sets:
+            self._stem_sets.move_to_end(stem)
+            return self._stem_sets[stem]
+
+        loop = asyncio.get_running_loop()
+        # One executor call per shard; cancellation takes effect between them
+        results = {}
+        for _, base_name in self.targets:
+            results[base_name] = await loop.run_in_executor(
+                search_executor,
+                lambda name: self.index_registry.get(name).indexer.clause_postings(
+                    stem, self.fuzzy, self.max_expansions, self.fields
+                ),
+                base_name,
+            )
+
+        self._stem_sets[stem] = results
+        while len(self._stem_sets) > self.memo_size:
+            self._stem_sets.popitem(last=False)
+        return results
+
+    @staticmethod
+    def _combine(previous: BookSets, word_sets: BookSets, match_all: bool) -> BookSets:
+        if match_all:
+            return {b: bits & word_sets.get(b, 0) for b, bits in previous.items()}
+        combined = dict(previous)
+        for b, bits in word_sets.items():
+            combined[b] = combined.get(b, 0) | bits
+        return combined
+
+    async def update(self, query: str, options: SearchOptions) -> dict:
+        """Refine the results for the new query text; returns a /data-shaped dict."""
+        if is_boolean(query or ""):
+            return await self._update_boolean(query, options)
+        stems = self._canonical_stems(query)
+
+        reused = 0
+        if options.strict == self.match_all:
+            while (
+                reused < min(len(stems), len(self.stems))
+                and stems[reused] == self.stems[reused]
+            ):
+                reused += 1
+        prefix = self._prefix[:reused]
+
+        evaluated = 0
+        for stem in stems[reused:]:
+            cached = stem in self._stem_sets
+            stem_sets = await self._lookup(stem)
+            evaluated += 0 if cached else 1
+            prefix.append(
+                {
+                    base_name: (
+                        self._combine(prefix[-1][base_name], sets, options.strict)
+                        if prefix
+                        else dict(sets)
+                    )
+                    for base_name, sets in stem_sets.items()
+                }
+            )
+
+        data = new_structure(self.index_registry, self.books)
+        loop = asyncio.get_running_loop()
+        for key, base_name in self.targets:
+            matched = prefix[-1][base_name].get(base_name) if prefix else None
+
+            def present(name, matched=matched):
+                shard = self.index_registry.get(name)
+                section_ids = shard.indexer.decode(name, matched) if matched else None
+                if section_ids and options.top_k > 0:
+                    section_ids = shard.indexer.rank(
+                        query or "", {name: section_ids}, options.top_k, field=self.fields
+                    )[name]
+                return present_sections(shard, section_ids, options)
+
+            data[key]["sections"] = await loop.run_in_executor(search_executor, present, base_name)
+
+        # Only commit once every await is behind us, so a cancelled
+        # (superseded) update never leaves half-built state
+        self.stems, self.match_all, self._prefix = stems, options.strict, prefix
+        return {"data": data, "reused": reused, "evaluated": evaluated}
+
+    async def _update_boolean(self, query: str, options: SearchOptions) -> dict:
+        """
+        Boolean queries don't grow word by word, so they are planned and run
+        whole (skipping shards their book: filters exclude) with nothing reused.
+        """
+        options = replace(options, books=self.books, fields=self.fields)
+        data = new_structure(self.index_registry, self.books)
+        loop = asyncio.get_running_loop()
+        targets = searched_targets(query, options, self.index_registry)
+        for key, base_name in targets:
+            data[key]["sections"] = await loop.run_in_executor(
+                search_executor, search_named_book, self.index_registry, base_name, query, options
+            )
+        # The next plain query starts from scratch
+        self.stems, self.match_all, self._prefix = [], options.strict, []
+        return {"data": data, "reused": 0, "evaluated": len(targets)}
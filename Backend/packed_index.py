@@ -0,0 +1,535 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import FUZZY_MAX_DISTANCE
+from fields import TitleField
+from fuzzy_index import FuzzyIndex, build_buckets
+from positional_index import PositionalIndex
+from ranking import BM25Stats
+from search_engine import porter_stem
+
+MAGIC = b"PMIX"
+# Bump on every layout change (a new or changed block), so open_packed
+# repacks files written by older code instead of serving them without it:
+#   2 fuzzy buckets, 3 book sections, 4 BM25 statistics, 5 positions,
+#   6 title statistics, 7 page postings
+FORMAT_VERSION = 7
+
+
+def source_fingerprint(index_raw: bytes, final_index_raw: Optional[bytes]) -> str:
+    """Shard fingerprint: sha256 of the index pickle followed by its final_index pickle."""
+    digest = hashlib.sha256(index_raw)
+    if final_index_raw is not None:
+        digest.update(final_index_raw)
+    return digest.hexdigest()
+
+
+def _source_stats(*paths: Path) -> List[list]:
+    # (size, mtime) per source; a packed file is stale as soon as either changes
+    return [
+        [path.stat().st_size, path.stat().st_mtime_ns] if path and path.exists() else None
+        for path in paths
+    ]
+
+
+class StringTable:
+    """Read-only view of ``[count][offsets * (count + 1)][utf-8 bytes]``."""
+
+    def __init__(self, buf: memoryview):
+        self.count = buf[:4].cast("I")[0]
+        end = 4 + 4 * (self.count + 1)
+        self.offsets = buf[4:end].cast("I")
+        self.data = buf[end:]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def raw(self, i: int) -> bytes:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+    def find(self, value: str) -> int:
+        """Position of value in a sorted table, or -1 (no decoding needed)."""
+        target = value.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self.raw(lo) == target else -1
+
+    @staticmethod
+    def pack(values: List[str]) -> bytes:
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = array("I", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return array("I", [len(encoded)]).tobytes() + offsets.tobytes() + b"".join(encoded)
+
+
+class MappedPostings(Mapping):
+    """stem → {book: [section ids]}, decoded from the mapped file on lookup."""
+
+    def __init__(self, stems: StringTable, offsets: memoryview, postings: memoryview,
+                 sections: StringTable, books: List[str]):
+        self._stems = stems
+        self._offsets = offsets
+        self._postings = postings
+        self._sections = sections
+        self._books = books
+        self._keys: Optional[List[str]] = None
+
+    def __getitem__(self, stem: str) -> Dict[str, List[str]]:
+        position = self._stems.find(stem)
+        if position < 0:
+            raise KeyError(stem)
+        result: Dict[str, List[str]] = {}
+        pairs = self._postings[2 * self._offsets[position]:2 * self._offsets[position + 1]]
+        for i in range(0, len(pairs), 2):
+            result.setdefault(self._books[pairs[i]], []).append(self._sections[pairs[i + 1]])
+        return result
+
+    def __iter__(self):
+        # The (small) key list is decoded once per process if something
+        # scans the vocabulary; postings stay in the shared mapping
+        if self._keys is None:
+            self._keys = [self._stems[i] for i in range(len(self._stems))]
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._stems)
+
+
+class MappedNested(Mapping):
+    """
+    stem → {book: {section id: value}} (term frequencies, token positions),
+    decoded from the mapped file on lookup. Each entry is (book, section,
+    start, end) into a uint32 value array; with ``scalar`` a value is the
+    single int at ``start``, else the tuple of the run.
+
+    The last few decoded stems are kept, since a phrase query asks for the
+    same stem once per candidate section.
+    """
+
+    RECENT = 64
+
+    def __init__(self, stems: StringTable, offsets: memoryview, entries: memoryview,
+                 values: memoryview, sections: StringTable, books: List[str], scalar: bool = False):
+        self._stems = stems
+        self._offsets = offsets
+        self._entries = entries
+        self._values = values
+        self._sections = sections
+        self._books = books
+        self._scalar = scalar
+        self._recent: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, stem: str) -> Dict[str, dict]:
+        with self._lock:
+            if stem in self._recent:
+                self._recent.move_to_end(stem)
+                return self._recent[stem]
+        position = self._stems.find(stem)
+        if position < 0 or self._offsets[position] == self._offsets[position + 1]:
+            raise KeyError(stem)
+        result: Dict[str, dict] = {}
+        entries = self._entries[4 * self._offsets[position]:4 * self._offsets[position + 1]]
+        for i in range(0, len(entries), 4):
+            book, sid, start, end = entries[i:i + 4]
+            value = self._values[start] if self._scalar else tuple(self._values[start:end])
+            result.setdefault(self._books[book], {})[self._sections[sid]] = value
+        with self._lock:
+            self._recent[stem] = result
+            while len(self._recent) > self.RECENT:
+                self._recent.popitem(last=False)
+        return result
+
+    def __iter__(self):
+        return (
+            self._stems[i]
+            for i in range(len(self._stems))
+            if self._offsets[i] != self._offsets[i + 1]
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def _pack_nested(nested: dict, stems: List[str], book_ordinal: Dict[str, int],
+                 sections: Dict[str, int]) -> Tuple[bytes, bytes, bytes]:
+    """(offsets, entries, values) blocks of a {stem: {book: {section id: value}}} mapping."""
+    offsets, entries, values = array("I", [0]), array("I"), array("I")
+    for stem in stems:
+        for book, by_section in nested.get(stem, {}).items():
+            for sid, value in by_section.items():
+                run = (value,) if isinstance(value, int) else value
+                entries.extend((
+                    book_ordinal[book],
+                    sections.setdefault(sid, len(sections)),
+                    len(values),
+                    len(values) + len(run),
+                ))
+                values.extend(run)
+        offsets.append(len(entries) // 4)
+    return offsets.tobytes(), entries.tobytes(), values.tobytes()
+
+
+def _index_stem(data: dict):
+    """Stem words like SearchEngine.stem does for this index (its own table first)."""
+    stem_lookup = data["stem_lookup"]
+    return lambda word: stem_lookup.get(word) or porter_stem(word)
+
+
+class MappedBuckets(Mapping):
+    """Fuzzy delete variant → stem ordinals, read from the mapped file on lookup."""
+
+    def __init__(self, variants: StringTable, offsets: memoryview, members: memoryview):
+        self._variants = variants
+        self._offsets = offsets
+        self._members = members
+
+    def __getitem__(self, variant: str) -> Tuple[int, ...]:
+        position = self._variants.find(variant)
+        if position < 0:
+            raise KeyError(variant)
+        return tuple(self._members[self._offsets[position]:self._offsets[position + 1]])
+
+    def __iter__(self):
+        return (self._variants[i] for i in range(len(self._variants)))
+
+    def __len__(self) -> int:
+        return len(self._variants)
+
+
+class MappedLookup(Mapping):
+    """word → stem for the original words of the book."""
+
+    def __init__(self, words: StringTable, word_stems: memoryview, stems: StringTable):
+        self._words = words
+        self._word_stems = word_stems
+        self._stems = stems
+
+    def __getitem__(self, word: str) -> str:
+        position = self._words.find(word)
+        if position < 0:
+            raise KeyError(word)
+        return self._stems[self._word_stems[position]]
+
+    def __iter__(self):
+        return (self._words[i] for i in range(len(self._words)))
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def items(self):
+        # Sequential scan without a bisect per word
+        return (
+            (self._words[i], self._stems[self._word_stems[i]])
+            for i in range(len(self._words))
+        )
+
+
+class LazyBooks(Mapping):
+    """
+    book → {section id: {title, content}}. Section text is not needed to
+    answer queries, so it is only unpickled if something asks for it.
+    """
+
+    def __init__(self, names: List[str], blob: memoryview):
+        self._names = names
+        self._blob = blob
+        self._books: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._books is None:
+            self._books = pickle.loads(self._blob)
+        return self._books
+
+    def __getitem__(self, name: str):
+        return self._load()[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class LazyPickle(Mapping):
+    """A pickled mapping inside the mapped file, only unpickled on first lookup."""
+
+    def __init__(self, blob: memoryview):
+        self._blob = blob
+        self._data: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = pickle.loads(self._blob)
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+class PackedIndex:
+    """
+    One book index laid out for ``mmap``.
+
+    Every uvicorn worker maps the same read-only file, so the postings and
+    vocabulary live once in the page cache instead of once per process, and
+    opening it costs no unpickling. Layout: ``PMIX``, format version, a JSON
+    header (fingerprint, source stats, block offsets), then 4-byte aligned
+    blocks of string tables and uint32 arrays.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        magic, version, header_len = buf[:4].tobytes(), buf[4:8].cast("I")[0], buf[8:12].cast("I")[0]
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} is not a v{FORMAT_VERSION} packed index")
+        self.header = json.loads(buf[12:12 + header_len].tobytes())
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{self.path} was packed on a {self.header['byteorder']}-endian host")
+
+        def block(name: str) -> memoryview:
+            start, length = self.header["blocks"][name]
+            return buf[start:start + length]
+
+        books = self.header["books"]
+        stems = StringTable(block("stems"))
+        self.fingerprint: str = self.header["fingerprint"]
+        self.index = MappedPostings(
+            stems,
+            block("postings_offsets").cast("I"),
+            block("postings").cast("I"),
+            StringTable(block("sections")),
+            books,
+        )
+        self.stem_lookup = MappedLookup(
+            StringTable(block("words")), block("word_stems").cast("I"), stems
+        )
+        self._stems = stems
+        self._fuzzy_buckets = MappedBuckets(
+            StringTable(block("fuzzy_variants")),
+            block("fuzzy_offsets").cast("I"),
+            block("fuzzy_members").cast("I"),
+        )
+        self.books = LazyBooks(books, block("books"))
+        self._book_sections = block("book_sections")
+        sections = StringTable(block("sections"))
+
+        def nested(name: str, scalar: bool = False) -> MappedNested:
+            return MappedNested(
+                stems,
+                block(f"{name}_offsets").cast("I"),
+                block(f"{name}_entries").cast("I"),
+                block(f"{name}_values").cast("I"),
+                sections,
+                books,
+                scalar,
+            )
+
+        # BM25 statistics (see ranking.BM25Stats)
+        self.term_freqs = nested("term_freqs", scalar=True)
+        self._section_lengths = block("section_lengths")
+        # Token positions, for phrase / NEAR (see positional_index)
+        self.positions = nested("positions")
+        # Title-only BM25 statistics and postings (see fields.TitleField)
+        self.title_freqs = nested("title_freqs", scalar=True)
+        self._title_lengths = block("title_lengths")
+        # Term → PDF page postings; indexes built before them have no block
+        self.page_postings = LazyPickle(block("pages")) if "pages" in self.header["blocks"] else None
+
+    def book_sections(self) -> Dict[str, List[str]]:
+        """book → sorted section IDs: the bitmap numbering, without scanning the postings."""
+        return pickle.loads(self._book_sections)
+
+    def bm25_stats(self) -> BM25Stats:
+        """Mapped term frequencies plus the (small) unpickled section lengths."""
+        return BM25Stats(self.term_freqs, pickle.loads(self._section_lengths))
+
+    def title_stats(self) -> BM25Stats:
+        return BM25Stats(self.title_freqs, pickle.loads(self._title_lengths))
+
+    def positional_index(self) -> PositionalIndex:
+        return PositionalIndex(self.positions)
+
+    def fuzzy_index(self, max_distance: int) -> Optional[FuzzyIndex]:
+        """The mapped fuzzy candidate index, if it was packed for this edit distance."""
+        if self.header["fuzzy_max_distance"] != max_distance:
+            return None
+        return FuzzyIndex.from_buckets(self._stems, self._fuzzy_buckets, max_distance)
+
+    def is_current(self, index_path: Path, final_index_path: Path) -> bool:
+        return self.header["sources"] == _source_stats(index_path, final_index_path)
+
+
+def pack(index_path: Path, final_index_path: Optional[Path], output_path: Path) -> Path:
+    """Convert one book's index pickle into a packed, mmap-able file."""
+    index_raw = Path(index_path).read_bytes()
+    final_raw = final_index_path.read_bytes() if final_index_path and final_index_path.exists() else None
+    data = pickle.loads(index_raw)
+
+    books = list(data["books"].keys())
+    book_ordinal = {name: i for i, name in enumerate(books)}
+    stems = sorted(data["index"], key=lambda s: s.encode("utf-8"))
+    stem_ordinal = {stem: i for i, stem in enumerate(stems)}
+
+    sections: Dict[str, int] = {}
+    book_sections = {book: set() for book in books}
+    offsets, postings = array("I", [0]), array("I")
+    for stem in stems:
+        for book, section_ids in data["index"][stem].items():
+            book_sections.setdefault(book, set()).update(section_ids)
+            for sid in section_ids:
+                postings.extend((book_ordinal[book], sections.setdefault(sid, len(sections))))
+        offsets.append(len(postings) // 2)
+
+    # Words whose stem never made it into the index can't match anything
+    words = sorted(
+        (w for w, stem in data["stem_lookup"].items() if stem in stem_ordinal),
+        key=lambda w: w.encode("utf-8"),
+    )
+    word_stems = array("I", (stem_ordinal[data["stem_lookup"][w]] for w in words))
+
+    # BM25 statistics; indexes that predate them get them from the section text
+    if "term_freqs" in data:
+        bm25 = BM25Stats(data["term_freqs"], data["section_lengths"])
+    else:
+        bm25 = BM25Stats.from_books(data["books"], _index_stem(data))
+    term_freqs = _pack_nested(bm25.term_freqs, stems, book_ordinal, sections)
+    if "positions" in data:
+        positional = PositionalIndex(data["positions"])
+    else:
+        positional = PositionalIndex.from_books(data["books"], _index_stem(data))
+    positions = _pack_nested(positional.positions, stems, book_ordinal, sections)
+    if "title_freqs" in data:
+        title = BM25Stats(data["title_freqs"], data["title_lengths"])
+    else:
+        title = TitleField.stats_from_books(data["books"], _index_stem(data))
+    title_freqs = _pack_nested(title.term_freqs, stems, book_ordinal, sections)
+
+    # Fuzzy delete buckets over the stem ordinals, so workers map them too
+    buckets = build_buckets(stems, FUZZY_MAX_DISTANCE)
+    variants = sorted(buckets, key=lambda v: v.encode("utf-8"))
+    fuzzy_offsets, fuzzy_members = array("I", [0]), array("I")
+    for variant in variants:
+        fuzzy_members.extend(buckets[variant])
+        fuzzy_offsets.append(len(fuzzy_members))
+
+    blocks = {
+        "stems": StringTable.pack(stems),
+        "postings_offsets": offsets.tobytes(),
+        "postings": postings.tobytes(),
+        "term_freqs_offsets": term_freqs[0],
+        "term_freqs_entries": term_freqs[1],
+        "term_freqs_values": term_freqs[2],
+        "positions_offsets": positions[0],
+        "positions_entries": positions[1],
+        "positions_values": positions[2],
+        "section_lengths": pickle.dumps(bm25.section_lengths, protocol=pickle.HIGHEST_PROTOCOL),
+        "title_freqs_offsets": title_freqs[0],
+        "title_freqs_entries": title_freqs[1],
+        "title_freqs_values": title_freqs[2],
+        "title_lengths": pickle.dumps(title.section_lengths, protocol=pickle.HIGHEST_PROTOCOL),
+        "sections": StringTable.pack(list(sections)),
+        "words": StringTable.pack(words),
+        "word_stems": word_stems.tobytes(),
+        "fuzzy_variants": StringTable.pack(variants),
+        "fuzzy_offsets": fuzzy_offsets.tobytes(),
+        "fuzzy_members": fuzzy_members.tobytes(),
+        "books": pickle.dumps(data["books"], protocol=pickle.HIGHEST_PROTOCOL),
+        # Same numbering BitmapPostings would derive from the postings
+        "book_sections": pickle.dumps(
+            {book: sorted(ids) for book, ids in book_sections.items() if ids},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        ),
+    }
+    if "page_postings" in data:
+        blocks["pages"] = pickle.dumps(data["page_postings"], protocol=pickle.HIGHEST_PROTOCOL)
+
+    # The header stores absolute block offsets, so size it with placeholders first
+    header = {
+        "fingerprint": source_fingerprint(index_raw, final_raw),
+        "sources": _source_stats(Path(index_path), final_index_path),
+        "byteorder": sys.byteorder,
+        "books": books,
+        "fuzzy_max_distance": FUZZY_MAX_DISTANCE,
+        "blocks": {name: [0, len(body)] for name, body in blocks.items()},
+    }
+    header_len = -1
+    while True:
+        header_bytes = json.dumps(header).encode("utf-8")
+        if len(header_bytes) == header_len:
+            break
+        header_len = len(header_bytes)
+        position = 12 + header_len
+        for name, body in blocks.items():
+            position += -position % 4
+            header["blocks"][name] = [position, len(body)]
+            position += len(body)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temp name + atomic replace: several workers may pack at once, and
+    # processes still mapping the old file keep reading its (unlinked) inode
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + array("I", [FORMAT_VERSION, len(header_bytes)]).tobytes() + header_bytes)
+        for name, body in blocks.items():
+            f.write(b"\0" * (header["blocks"][name][0] - f.tell()))
+            f.write(body)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def open_packed(index_path: Path, final_index_path: Optional[Path], packed_folder: Path) -> PackedIndex:
+    """Map the packed copy of an index pickle, (re)packing it first if it is missing or stale."""
+    packed_path = Path(packed_folder) / f"{Path(index_path).stem}.pmix"
+    if packed_path.exists():
+        try:
+            packed = PackedIndex(packed_path)
+            if packed.is_current(Path(index_path), final_index_path):
+                return packed
+        except (ValueError, KeyError):
+            pass  # older format or foreign host: repack below
+    print(f"📦 Packing {Path(index_path).name} → {packed_path}")
+    return PackedIndex(pack(Path(index_path), final_index_path, packed_path))
+
+
+def main():
+    from config import PACKED_INDEX_FOLDER
+    from index_registry import registry
+
+    for pkl_file, final_index_path, packed_folder in registry.source_files():
+        # A generation's packed copies live in its own folder
+        path = pack(pkl_file, final_index_path, Path(packed_folder or PACKED_INDEX_FOLDER) / f"{pkl_file.stem}.pmix")
+        print(f"✅ {pkl_file.name} → {path} ({path.stat().st_size // 1024} KiB)")
+
+
+if __name__ == "__main__":
+    main()
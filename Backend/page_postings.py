@@ -0,0 +1,46 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Mapping
+
+from bitmap_postings import bit_positions, to_bitmap
+from tokens import words
+
+SECTION = "section"  # results are section IDs (the classic response)
+PAGE = "page"  # results are the PDF pages the terms occur on
+GRANULARITIES = (SECTION, PAGE)
+
+
+def page_index(pages: List[str], stem: Callable[[str], str]) -> Dict[str, tuple]:
+    """``{stem: (PDF page, ...)}`` for one book's page texts (pages numbered from 1)."""
+    found = defaultdict(list)
+    for page_number, text in enumerate(pages, start=1):
+        for term in {stem(word) for word in words(text)}:
+            found[term].append(page_number)
+    return {term: tuple(numbers) for term, numbers in found.items()}
+
+
+class PagePostings:
+    """
+    ``{stem: {book: (PDF page, ...)}}``, recorded by PDFBookIndexer while
+    it extracts each page's text. Pages are the PDF's own (1-based), so a
+    viewer can open them directly, without final_index or page_offset.
+
+    Page numbers are already dense ints, so a stem's pages become a bitmap
+    with bit n set for page n; bitmaps are built per stem on first use.
+    """
+
+    def __init__(self, pages: Mapping):
+        self.pages = pages
+        self._bitmaps: Dict[str, Dict[str, int]] = {}
+
+    def get(self, stem: str) -> Dict[str, int]:
+        """book → bitmap of the pages containing ``stem`` (empty if none)."""
+        bitmaps = self._bitmaps.get(stem)
+        if bitmaps is None:
+            bitmaps = self._bitmaps[stem] = {
+                book: to_bitmap(numbers) for book, numbers in self.pages.get(stem, {}).items()
+            }
+        return bitmaps
+
+    @staticmethod
+    def decode(bits: int) -> List[int]:
+        return list(bit_positions(bits))
@@ -0,0 +1,38 @@
+from collections import defaultdict
+from typing import Callable, Mapping, Tuple
+
+from tokens import section_tokens
+
+
+class PositionalIndex:
+    """
+    ``{stem: {book: {section id: (token positions, ...)}}}`` for phrase and
+    NEAR/k queries. Positions count only indexed words (three letters or
+    more), the same tokens queries are split into, so "return on
+    investment" is the adjacent pair return, investment.
+
+    Written by PDFBookIndexer.save_index and stored in packed shards; older
+    indexes rebuild it from the stored section text with ``from_books``.
+    """
+
+    def __init__(self, positions: Mapping):
+        self.positions = positions
+
+    @classmethod
+    def from_books(cls, books: Mapping, stem: Callable[[str], str]) -> "PositionalIndex":
+        positions = defaultdict(lambda: defaultdict(dict))
+        for book, sections in books.items():
+            for sid, section in sections.items():
+                by_stem = defaultdict(list)
+                for position, token in enumerate(section_tokens(section, stem)):
+                    by_stem[token].append(position)
+                for token, found in by_stem.items():
+                    positions[token][book][sid] = tuple(found)
+        return cls({token: dict(books) for token, books in positions.items()})
+
+    def get(self, stem: str, book: str, sid: str) -> Tuple[int, ...]:
+        return self.positions.get(stem, {}).get(book, {}).get(sid, ())
+
+    def section_positions(self, book: str, sid: str) -> Callable[[str], Tuple[int, ...]]:
+        """``stem → positions`` inside one section, as query_syntax.spans expects."""
+        return lambda stem: self.get(stem, book, sid)
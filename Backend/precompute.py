@@ -0,0 +1,131 @@
+import multiprocessing
+import sqlite3
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from index_registry import IndexRegistry, registry
+
+
+PRECOMPUTED_STORE = Path("./Data/precomputed/responses.sqlite3")
+
+
+def vocabulary(index_registry: IndexRegistry) -> Dict[str, str]:
+    """Map every stem in the loaded books to one original word that produces it."""
+    vocab = {}
+    for name in index_registry.names():
+        for word, stem in index_registry.get(name).indexer.stem_lookup.items():
+            vocab.setdefault(stem, word)
+    return dict(sorted(vocab.items()))
+
+
+def _render_single_term(word: str) -> bytes:
+    from responses import render_json
+    from runner import main
+
+    # With one term AND and OR coincide, so strict mode yields the same body
+    return zlib.compress(render_json(main(word, False)), 9)
+
+
+def _init_worker():
+    import io
+    import contextlib
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        registry.load_all()
+
+
+def _render_batch(batch: List[Tuple[str, str]]) -> List[Tuple[str, bytes]]:
+    import io
+    import contextlib
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [(stem, _render_single_term(word)) for stem, word in batch]
+
+
+def build_store(
+    output_path: Path = PRECOMPUTED_STORE,
+    index_registry: IndexRegistry = registry,
+    workers: Optional[int] = None,
+    batch_size: int = 64,
+):
+    """
+    Run search2 → return_hierarchy → build_amt_structure once for every stem
+    and write the zlib-compressed /data bodies to a SQLite key-value file.
+    """
+    index_registry.load_all()
+    vocab = list(vocabulary(index_registry).items())
+    batches = [vocab[i:i + batch_size] for i in range(0, len(vocab), batch_size)]
+    print(f"🧮 Precomputing {len(vocab)} single-term responses...")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    db = sqlite3.connect(tmp_path)
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.execute("CREATE TABLE responses (stem TEXT PRIMARY KEY, body BLOB) WITHOUT ROWID")
+    db.execute("INSERT INTO meta VALUES ('generation', ?)", (index_registry.generation,))
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        for done, rows in enumerate(pool.map(_render_batch, batches), start=1):
+            db.executemany("INSERT INTO responses VALUES (?, ?)", rows)
+            if done % 10 == 0 or done == len(batches):
+                print(f"   {min(done * batch_size, len(vocab))}/{len(vocab)}")
+
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+    tmp_path.replace(output_path)
+    print(f"✅ Saved precomputed responses → {output_path}")
+
+
+class PrecomputedStore:
+    """Read-only lookup of precomputed single-term /data responses."""
+
+    def __init__(self, path: Path = PRECOMPUTED_STORE):
+        self.path = Path(path)
+        self._db = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self.generation = row[0] if row else ""
+
+    @classmethod
+    def open_for(cls, index_registry: IndexRegistry, path: Path = PRECOMPUTED_STORE):
+        """Open the store only if it was built from the currently loaded indexes."""
+        if not Path(path).exists():
+            return None
+        store = cls(path)
+        if store.generation != index_registry.generation:
+            print(f"⚠️ Ignoring {path}: built for generation {store.generation}")
+            store.close()
+            return None
+        return store
+
+    def get(self, stems: tuple) -> Optional[bytes]:
+        if len(stems) != 1 or not isinstance(stems[0], str):
+            return None  # only single plain words are precomputed
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body FROM responses WHERE stem = ?", (stems[0],)
+            ).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def close(self):
+        self._db.close()
+
+
+def main():
+    output_path = Path(sys.argv[1]) if len(sys.argv) > 1 else PRECOMPUTED_STORE
+    build_store(output_path)
+
+
+if __name__ == "__main__":
+    main()
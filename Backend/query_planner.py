@@ -0,0 +1,342 @@
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from query_syntax import NEAR, PHRASE, Clause, clause_stems
+from tokens import WORD, WORD_PATTERN
+
+# Boolean query trees. Leaves are query_syntax clauses (stems, phrases, NEAR
+# pairs) or filters; inner nodes combine them:
+#   ("and", child, ...)   ("or", child, ...)   ("not", child)
+#   ("book", name)        the book whose response key or index name is `name`
+#   ("section", "4.6")    section 4.6 and everything below it
+AND = "and"
+OR = "or"
+NOT = "not"
+BOOK = "book"
+SECTION = "section"
+
+# Upper-case AND / OR / NOT, parentheses or a filter switch a query to the
+# boolean grammar; lower-case "and" / "or" / "not" stay ordinary words
+OPERATOR_PATTERN = re.compile(r'\b(?:AND|OR|NOT)\b|[()]')
+FILTER_PATTERN = re.compile(r'\b(?:book|section):', re.IGNORECASE)
+TOKEN_PATTERN = re.compile(
+    r'"(?P<phrase>[^"]*)"?'
+    r'|(?P<paren>[()])'
+    r'|\b(?P<op>AND|OR|NOT)\b'
+    r'|\b(?P<filter>book|section):(?P<value>[\w.-]+)'
+    r'|\b(?P<near>near)/(?P<distance>\d+)\b'
+    rf'|\b(?P<word>{WORD})\b',
+    re.IGNORECASE,
+)
+
+
+def is_boolean(query: str) -> bool:
+    query = query or ""
+    return bool(OPERATOR_PATTERN.search(query) or FILTER_PATTERN.search(query))
+
+
+class _Parser:
+    """
+    Recursive descent over::
+
+        or    := and (OR and)*
+        and   := unary (AND unary)*
+        unary := NOT unary | "(" or ")" | phrase | word | book:x | section:x
+                 (operands may be joined by NEAR/k)
+
+    Juxtaposed operands are joined by the implicit operator (AND for strict
+    searches, OR otherwise), with that operator's precedence, except that
+    "a NOT b" always means a AND NOT b and juxtaposed book: / section:
+    filters are always AND-ed onto their group. Malformed input never
+    raises: stray operators and parentheses are skipped.
+    """
+
+    def __init__(self, query: str, stem: Callable[[str], str], implicit: str):
+        self.stem = stem
+        self.implicit = implicit
+        self.tokens: List[Tuple[str, object]] = []
+        for match in TOKEN_PATTERN.finditer(query or ""):
+            if match.group("op") is not None and match.group("op").isupper():
+                self.tokens.append(("op", match.group("op").lower()))
+            elif match.group("op") is not None:
+                # "and" / "not" typed in lower case are plain words; "or" is
+                # too short to be one, as everywhere else in the index
+                if WORD_PATTERN.fullmatch(match.group("op")):
+                    self.tokens.append(("leaf", stem(match.group("op").lower())))
+            elif match.group("paren") is not None:
+                self.tokens.append(("paren", match.group("paren")))
+            elif match.group("filter") is not None:
+                self.tokens.append(("leaf", (match.group("filter").lower(), match.group("value").lower())))
+            elif match.group("near") is not None:
+                self.tokens.append(("near", int(match.group("distance"))))
+            elif match.group("word") is not None:
+                self.tokens.append(("leaf", stem(match.group("word").lower())))
+            else:
+                stems = tuple(stem(w) for w in WORD_PATTERN.findall(match.group("phrase").lower()))
+                if len(stems) == 1:
+                    self.tokens.append(("leaf", stems[0]))
+                elif stems:
+                    self.tokens.append(("leaf", (PHRASE, stems)))
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, object]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, object]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def starts_operand(self) -> bool:
+        token = self.peek()
+        return token is not None and (
+            token[0] == "leaf" or token == ("paren", "(") or token == ("op", NOT)
+        )
+
+    def parse(self):
+        node = self.parse_or()
+        # Whatever couldn't be parsed (a stray ")" ...) is skipped, not fatal
+        while self.position < len(self.tokens):
+            self.take()
+            rest = self.parse_or()
+            if rest is not None:
+                node = rest if node is None else (self.implicit, node, rest)
+        return node
+
+    def parse_or(self):
+        # Runs of operands joined by an explicit OR; runs themselves are
+        # joined by juxtaposition (the implicit OR of a non-strict search)
+        runs = [[self.parse_and()]]
+        while True:
+            if self.peek() == ("op", OR):
+                self.take()
+                runs[-1].append(self.parse_and())
+            elif self.implicit == OR and self.starts_operand():
+                runs.append([self.parse_and()])
+            else:
+                break
+        # A juxtaposed filter narrows the group it sits in instead of adding
+        # to it: "risk book:PMBook" is risk AND book:PMBook in either mode
+        terms, filters = [], []
+        for run in runs:
+            node = _join(OR, run)
+            if node is not None:
+                (filters if is_filter(node) else terms).append(node)
+        return _join(AND, [_join(OR, terms)] + filters)
+
+    def parse_and(self):
+        items = [self.parse_unary()]
+        while True:
+            if self.peek() == ("op", AND):
+                self.take()
+            elif self.peek() == ("op", NOT):
+                pass  # "a NOT b" excludes b from a's matches, even in OR mode
+            elif not (self.implicit == AND and self.starts_operand()):
+                break
+            items.append(self.parse_unary())
+        return _join(AND, items)
+
+    def parse_unary(self):
+        token = self.peek()
+        if token is None:
+            return None
+        if token == ("op", NOT):
+            self.take()
+            child = self.parse_unary()
+            return (NOT, child) if child is not None else None
+        if token == ("paren", "("):
+            self.take()
+            node = self.parse_or()
+            if self.peek() == ("paren", ")"):
+                self.take()
+            return node
+        if token[0] == "leaf":
+            self.take()
+            return self.parse_near(token[1])
+        # Operator or ")" where an operand belongs: drop it
+        self.take()
+        return None
+
+    def parse_near(self, left):
+        while (
+            self.peek() is not None
+            and self.peek()[0] == "near"
+            and self.position + 1 < len(self.tokens)
+            and self.tokens[self.position + 1][0] == "leaf"
+            and is_clause(left)
+            and is_clause(self.tokens[self.position + 1][1])
+        ):
+            distance = self.take()[1]
+            left = (NEAR, distance, left, self.take()[1])
+        if self.peek() is not None and self.peek()[0] == "near":
+            self.take()  # NEAR/k without a usable right operand
+        return left
+
+
+def _join(op: str, children: list):
+    children = [child for child in children if child is not None]
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else (op, *children)
+
+
+def is_clause(node) -> bool:
+    """Whether a node is a query_syntax clause (a stem, phrase or NEAR pair)."""
+    return isinstance(node, str) or node[0] in (PHRASE, NEAR)
+
+
+def is_filter(node) -> bool:
+    """Whether a node only restricts where matches may come from (book:, section:)."""
+    if is_clause(node):
+        return False
+    if node[0] in (BOOK, SECTION):
+        return True
+    return all(is_filter(child) for child in node[1:])
+
+
+def normalize(node):
+    """
+    Canonical form: nested AND/OR flattened, duplicate children dropped and
+    children sorted, so equivalent queries share one cache key.
+    """
+    if node is None or is_clause(node) or node[0] in (BOOK, SECTION):
+        return node
+    if node[0] == NOT:
+        child = normalize(node[1])
+        return child[1] if not is_clause(child) and child[0] == NOT else (NOT, child)
+    children = set()
+    for child in (normalize(c) for c in node[1:]):
+        if not is_clause(child) and child[0] == node[0]:
+            children.update(child[1:])
+        else:
+            children.add(child)
+    children = sorted(children, key=repr)
+    return children[0] if len(children) == 1 else (node[0], *children)
+
+
+def compile_query(query: str, stem: Callable[[str], str], match_all: bool = False):
+    """Normalized boolean tree for a query, or None if it has no searchable terms."""
+    return normalize(_Parser(query, stem, AND if match_all else OR).parse())
+
+
+def positive_clauses(node) -> List[Clause]:
+    """Clauses a match must (or may) contain: everything not under a NOT, for ranking."""
+    if node is None:
+        return []
+    if is_clause(node):
+        return [node]
+    if node[0] in (BOOK, SECTION, NOT):
+        return []
+    return [clause for child in node[1:] for clause in positive_clauses(child)]
+
+
+def possible_books(node, names: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Which books (keys of ``names``, each with its accepted lower-case names)
+    a tree can match. Only ``book:`` filters narrow it down, so shards
+    outside the result need not be searched at all.
+    """
+    everything = set(names)
+    if node is None:
+        return set()
+    if is_clause(node) or node[0] in (SECTION, NOT):
+        return everything  # NOT book:x may still match any other book
+    if node[0] == BOOK:
+        return {book for book, aliases in names.items() if node[1] in aliases}
+    found = [possible_books(child, names) for child in node[1:]]
+    if node[0] == AND:
+        return set.intersection(*found)
+    return set.union(*found)
+
+
+class PlanExecutor:
+    """
+    Evaluates a boolean tree against one shard's bitmap postings.
+
+    AND children run cheapest first, by their estimated posting-list size
+    (the smallest exact section count among a clause's stems, 0 for a book
+    filter naming another book). The running intersection stops the moment it is empty, and NOT
+    children are only subtracted from what is left. Results are sound
+    lower bounds: when the deadline cuts evaluation short, unevaluated
+    parts count as matching nothing, and a NOT over an incomplete child
+    matches nothing either.
+    """
+
+    def __init__(self, postings, book: str, aliases: Iterable[str], clause_postings: Callable, deadline=None):
+        self.postings = postings  # BitmapPostings of the searched field
+        self.book = book
+        self.aliases = set(aliases)  # lower-case names a book: filter may use
+        self.clause_postings = clause_postings  # clause → {book: bitmap}, memoized by the caller
+        self.deadline = deadline
+        # Every section the index knows, for NOT and filters
+        self.universe = (1 << len(postings.sections.get(book, ()))) - 1
+        self.truncated = False
+
+    def estimate(self, node) -> int:
+        if is_clause(node):
+            return min(
+                self.postings.get(stem).get(self.book, 0).bit_count()
+                for stem in clause_stems(node)
+            )
+        kind = node[0]
+        if kind == BOOK:
+            return self.universe.bit_count() if node[1] in self.aliases else 0
+        if kind == SECTION:
+            return self.section_bits(node[1]).bit_count()
+        if kind == NOT:
+            return self.universe.bit_count() - self.estimate(node[1])
+        estimates = [self.estimate(child) for child in node[1:]]
+        return min(estimates) if kind == AND else sum(estimates)
+
+    def section_bits(self, prefix: str) -> int:
+        sections = self.postings.sections.get(self.book, [])
+        return self.postings.encode(
+            self.book, (sid for sid in sections if sid == prefix or sid.startswith(prefix + "."))
+        )
+
+    def run(self, node) -> Tuple[int, bool]:
+        """(bitmap, exact) for ``node`` in this book."""
+        if is_clause(node):
+            if self.deadline is not None and self.deadline.expired():
+                self.truncated = True
+                return 0, False
+            return self.clause_postings(node).get(self.book, 0), True
+
+        kind = node[0]
+        if kind == BOOK:
+            return (self.universe if node[1] in self.aliases else 0), True
+        if kind == SECTION:
+            return self.section_bits(node[1]), True
+        if kind == NOT:
+            bits, exact = self.run(node[1])
+            return (self.universe & ~bits, True) if exact else (0, False)
+
+        if kind == OR:
+            result, exact = 0, True
+            for child in node[1:]:
+                bits, child_exact = self.run(child)
+                result |= bits
+                exact = exact and child_exact
+            return result, exact
+
+        # AND: positives cheapest first, then subtract the negatives
+        positives = sorted(
+            (child for child in node[1:] if is_clause(child) or child[0] != NOT),
+            key=self.estimate,
+        )
+        negatives = [child[1] for child in node[1:] if not is_clause(child) and child[0] == NOT]
+        result, exact = self.universe, True
+        for child in positives:
+            bits, child_exact = self.run(child)
+            result &= bits
+            exact = exact and child_exact
+            if not result:
+                return 0, exact or (child_exact and not bits)
+        for child in negatives:
+            bits, child_exact = self.run(child)
+            if not child_exact:
+                return 0, False
+            result &= ~bits
+            if not result:
+                break
+        return result, exact
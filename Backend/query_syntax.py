@@ -0,0 +1,101 @@
+import re
+from typing import Callable, List, Tuple, Union
+
+from tokens import WORD, WORD_PATTERN
+
+# A query is a list of clauses, each matched like one word of a plain query
+# (AND-ed or OR-ed with the others by match_all):
+#   "stem"                      a single word
+#   ("phrase", (stem, ...))     words at consecutive positions: "risk register"
+#   ("near", k, left, right)    two clauses at most k positions apart, either
+#                               order: risk NEAR/3 register
+Clause = Union[str, tuple]
+
+PHRASE = "phrase"
+NEAR = "near"
+
+# Quoted phrase (an unclosed quote runs to the end), NEAR/k, or a plain word
+TOKEN_PATTERN = re.compile(rf'"([^"]*)"?|\bnear/(\d+)\b|(\b{WORD}\b)')
+
+
+def has_operators(query: str) -> bool:
+    return '"' in query or "near/" in query.lower()
+
+
+def parse(query: str, stem: Callable[[str], str]) -> List[Clause]:
+    """
+    Clauses of a query. Without quotes or NEAR/k this is just the stems of
+    its words, so plain queries behave exactly as before. Words shorter
+    than three letters are dropped everywhere, as at index time.
+    """
+    query = (query or "").lower()
+    if not has_operators(query):
+        return [stem(word) for word in WORD_PATTERN.findall(query)]
+
+    # Operands and ("near", k) markers in query order
+    items: List[Union[Clause, Tuple[str, int]]] = []
+    for match in TOKEN_PATTERN.finditer(query):
+        phrase, near, word = match.groups()
+        if word is not None:
+            items.append(stem(word))
+        elif near is not None:
+            items.append((NEAR, int(near)))
+        else:
+            stems = tuple(stem(w) for w in WORD_PATTERN.findall(phrase))
+            if len(stems) == 1:
+                items.append(stems[0])
+            elif stems:
+                items.append((PHRASE, stems))
+
+    # Fold "a NEAR/k b" left to right; a NEAR/k without an operand on both
+    # sides is ignored
+    clauses: List[Clause] = []
+    pending_near = None
+    for item in items:
+        if isinstance(item, tuple) and item[0] == NEAR and len(item) == 2:
+            pending_near = item[1] if clauses else None
+            continue
+        if pending_near is not None:
+            item = (NEAR, pending_near, clauses.pop(), item)
+            pending_near = None
+        clauses.append(item)
+    return clauses
+
+
+def clause_stems(clause: Clause) -> List[str]:
+    """Every stem a clause needs, in query order."""
+    if isinstance(clause, str):
+        return [clause]
+    if clause[0] == PHRASE:
+        return list(clause[1])
+    return clause_stems(clause[2]) + clause_stems(clause[3])
+
+
+def spans(clause: Clause, positions: Callable[[str], Tuple[int, ...]]) -> List[Tuple[int, int]]:
+    """
+    (first, last) token positions where a clause matches inside one section,
+    sorted by start. ``positions(stem)`` gives the stem's sorted positions.
+    """
+    if isinstance(clause, str):
+        return [(p, p) for p in positions(clause)]
+
+    if clause[0] == PHRASE:
+        stems = clause[1]
+        starts = set(positions(stems[0]))
+        for offset, s in enumerate(stems[1:], start=1):
+            if not starts:
+                break
+            starts &= {p - offset for p in positions(s)}
+        return [(start, start + len(stems) - 1) for start in sorted(starts)]
+
+    _, k, left, right = clause
+    right_spans = spans(right, positions)
+    found = set()
+    if right_spans:
+        for a_start, a_end in spans(left, positions):
+            for b_start, b_end in right_spans:
+                if b_start - a_end > k:
+                    break  # sorted by start: every later span is further away
+                if a_start - b_end <= k:
+                    found.add((min(a_start, b_start), max(a_end, b_end)))
+    return sorted(found)
@@ -0,0 +1,89 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Mapping
+
+from tokens import section_tokens
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Weight of a section's title-only BM25 score when ranking all fields
+TITLE_BOOST = 2.0
+
+
+def section_terms(section: dict, stem: Callable[[str], str]) -> Counter:
+    """Stem counts of one section, tokenized exactly like build_index tokenizes it."""
+    return Counter(section_tokens(section, stem))
+
+
+class BM25Stats:
+    """
+    Term frequencies and section lengths of one index, for BM25 ranking.
+
+    ``term_freqs`` is ``{stem: {book: {section id: count}}}`` and
+    ``section_lengths`` is ``{book: {section id: tokens}}``, as written by
+    PDFBookIndexer.save_index. Older indexes don't carry them;
+    ``from_books`` recomputes both from the stored section text.
+    """
+
+    def __init__(self, term_freqs: Mapping, section_lengths: Mapping):
+        self.term_freqs = term_freqs
+        self.section_lengths = section_lengths
+        self.avg_length = {
+            book: (sum(lengths.values()) / len(lengths)) if lengths else 0.0
+            for book, lengths in section_lengths.items()
+        }
+
+    @classmethod
+    def from_books(cls, books: Mapping, stem: Callable[[str], str]) -> "BM25Stats":
+        term_freqs = defaultdict(lambda: defaultdict(dict))
+        section_lengths = {}
+        for book, sections in books.items():
+            lengths = section_lengths[book] = {}
+            for sid, section in sections.items():
+                counts = section_terms(section, stem)
+                lengths[sid] = sum(counts.values())
+                for term, count in counts.items():
+                    term_freqs[term][book][sid] = count
+        return cls({term: dict(books) for term, books in term_freqs.items()}, section_lengths)
+
+    def idf(self, term: str, book: str) -> float:
+        sections = len(self.section_lengths.get(book, ()))
+        df = len(self.term_freqs.get(term, {}).get(book, ()))
+        return math.log(1 + (sections - df + 0.5) / (df + 0.5))
+
+    def term_scores(self, term: str, book: str) -> Dict[str, float]:
+        """BM25 contribution of ``term`` to every section of ``book`` containing it."""
+        freqs = self.term_freqs.get(term, {}).get(book)
+        if not freqs:
+            return {}
+        idf = self.idf(term, book)
+        lengths = self.section_lengths[book]
+        avg_length = self.avg_length[book] or 1.0
+        return {
+            sid: idf * tf * (BM25_K1 + 1)
+            / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(sid, 0) / avg_length))
+            for sid, tf in freqs.items()
+        }
+
+    def scores(self, book: str, word_terms: List[List[str]]) -> Dict[str, float]:
+        """
+        BM25 score per section of ``book``: the sum over query words of the
+        section's best score among that word's terms (the stem and its fuzzy
+        expansions), so expansions can't outweigh the word itself.
+        """
+        scores = defaultdict(float)
+        for terms in word_terms:
+            best = defaultdict(float)
+            for term in terms:
+                for sid, score in self.term_scores(term, book).items():
+                    best[sid] = max(best[sid], score)
+            for sid, score in best.items():
+                scores[sid] += score
+        return scores
+
+
+def top_k(section_ids: List[str], scores: Mapping[str, float], k: int) -> List[str]:
+    """The ``k`` best of ``section_ids`` (best first); ties keep the given (sorted ID) order."""
+    return heapq.nlargest(k, section_ids, key=lambda sid: scores.get(sid, 0.0))
@@ -0,0 +1,158 @@
+import gzip
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from config import COMPRESS_CACHE_MAX_MB, COMPRESS_MIN_BYTES
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+
+def render_json(data) -> bytes:
+    """Serialize a response body once, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (q=0 means refused)."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+# (body, encoding) → compressed body, least recently used first
+_compressed: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+_compressed_bytes = 0
+_compressed_lock = threading.Lock()
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    """
+    Compressed body, so repeated queries (served from the query cache as
+    the same bytes) pay for compression once. Kept entries are bounded by
+    COMPRESS_CACHE_MAX_MB of original plus compressed bytes.
+    """
+    global _compressed_bytes
+    key = (content, encoding)
+    with _compressed_lock:
+        body = _compressed.get(key)
+        if body is not None:
+            _compressed.move_to_end(key)
+            return body
+
+    if encoding == "br":
+        body = brotli.compress(content, quality=5)
+    else:
+        body = gzip.compress(content, compresslevel=6)
+
+    max_bytes = COMPRESS_CACHE_MAX_MB * 1024 * 1024
+    if len(content) + len(body) <= max_bytes:
+        with _compressed_lock:
+            if key not in _compressed:
+                _compressed[key] = body
+                _compressed_bytes += len(content) + len(body)
+            while _compressed_bytes > max_bytes:
+                (old_content, _), old_body = _compressed.popitem(last=False)
+                _compressed_bytes -= len(old_content) + len(old_body)
+    return body
+
+
+def representation_etag(request: Request, tag: str) -> str:
+    """
+    Strong ETag for the representation this client will receive. Compressed
+    and identity bodies are different bytes, so the encoding is part of it.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag for candidate in header.split(",")
+    )
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=dict(headers, Vary="Accept-Encoding"))
+
+
+def json_response(
+    request: Request,
+    content: bytes,
+    headers: Optional[dict] = None,
+    status_code: int = 200,
+) -> Response:
+    """Pre-serialized JSON response, compressed when the client allows it."""
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    if len(content) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            content = compress(content, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(
+        content=content,
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+async def _compressed_frames(frames: AsyncIterator[bytes], encoding: str):
+    # Flush after every frame so each book still reaches the client immediately
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        async for frame in frames:
+            yield compressor.process(frame) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 → gzip container
+        async for frame in frames:
+            yield compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def ndjson_response(request: Request, frames: AsyncIterator[bytes]) -> StreamingResponse:
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is not None:
+        frames = _compressed_frames(frames, encoding)
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(frames, media_type="application/x-ndjson", headers=headers)
@@ -1,14 +1,16 @@
 import os
-import pickle
-import sys
-import json
-from pathlib import Path
-from create_index import PDFBookIndexer
-import json
-import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from dataclasses import dataclass
+from config import RANKED_MAX_K, SEARCH_MAX_WORKERS
+from fields import ALL
+from page_postings import PAGE, SECTION
+from search_engine import SearchEngine
+from index_registry import BookShard, IndexRegistry, registry
+from query_planner import is_boolean, possible_books
 import re
 import pathlib
-import urllib.parse
 
 
 def get_book_file_url():
@@ -114,129 +116,422 @@ def build_amt_structure(hierarchy_dict, book_sections):
 
 
 path = get_book_file_url()
-stucture: dict[str, dict] = {
-    "PMBook": {
-        "name": "PMBOK Guide",
-        "icon": "BookOpen",
-        "color": "indigo",
-    },
-    "PRINCE2": {
-        "name": "PRINCE 2",
-        "icon": "FileText",
-        "color": "cyan",
-    },
-    "ISO": {
-        "name": "ISO",
-        "icon": "BookOpen",
-        "color": "purple",
-    },
-    # "Path": {"route": path},
-}
-
-
-def main(query: str, strict_mode: bool):
-    # if len(sys.argv) < 3:
-    #     print("Usage: python pdf_index_loader.py <index_folder> <query>")
-    #     sys.exit(1)
-
-    index_folder = Path("./Data/index")
-    final_index_folder = Path("./Data/final_index")
-    # query = " ".join(sys.argv[3:])
-
-    if not index_folder.exists():
-        print(f"❌ Folder '{index_folder}' not found.")
-        sys.exit(1)
-
-    pkl_files = sorted(index_folder.glob("*.pkl"), key=lambda x: x.name.lower())
-    if not pkl_files:
-        print("⚠️ No .pkl index files found.")
-        sys.exit(0)
-
-    print(f"🔍 Searching '{query}' across {len(pkl_files)} indexes...\n")
-
-    for index, pkl_file in enumerate(pkl_files):
-        file_name = str(pkl_file.name)
-        base_name = file_name.split("_")[0]
-        print("BASE NAME ",base_name)
-        print(f"📖 Loading index → {pkl_file.name}")
-        indexer = PDFBookIndexer()
-        indexer.load_index(str(pkl_file))
-
-        section_ids = indexer.search2(query, match_all=strict_mode)
-        # print(section_ids)
-        section_ids = section_ids.get(base_name, None)
-        if not section_ids:
-            if index == 0:
-                stucture["PMBook"]["sections"] = []
-            elif index == 1:
-                stucture["PRINCE2"]["sections"] = []
-            elif index == 2:
-                stucture["ISO"]["sections"] = []
+
+# Bounded pool shared by every request; each book of a query is one task
+search_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="book-search"
+)
+
+
+def new_structure(
+    index_registry: IndexRegistry = registry, books: tuple = (), granularity: str = SECTION
+) -> dict[str, dict]:
+    """Fresh response skeleton for a single request (never shared)."""
+    return {
+        book.key: dict(book.meta(), **{result_key(granularity): []})
+        for book in index_registry.books
+        if not books or book.key in books
+    }
+
+
+def result_key(granularity: str) -> str:
+    """Where a book's results go in a /data body: "sections", or "pages" at page granularity."""
+    return "pages" if granularity == PAGE else "sections"
+
+
+def book_targets(index_registry: IndexRegistry, books: tuple = ()) -> list[tuple[str, str]]:
+    """(response key, shard name) per catalogued book, optionally only the requested keys."""
+    return [
+        (book.key, book.base_name)
+        for book in index_registry.books
+        if not books or book.key in books
+    ]
+
+
+def _books(value) -> tuple:
+    # ["PMBook", "ISO"] from JSON, or "PMBook,ISO" from a query string
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(sorted({str(key).strip() for key in value if str(key).strip()}))
+
+
+def _top_k(value) -> int:
+    try:
+        top_k = int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, min(top_k, RANKED_MAX_K))
+
+
+def _flag(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    """Per-request knobs that change what a book search returns."""
+
+    strict: bool = False
+    # Return only {main section: [section ids]}; titles/pages come from the TOC manifest
+    compact: bool = False
+    # Fuzzy expansion per query word; lowered by admission control under load
+    fuzzy: bool = True
+    max_expansions: int = 5
+    # Response keys of the books to search; empty means every catalogued book
+    books: tuple = ()
+    # > 0: only the top_k BM25-ranked sections per book, best first; 0: every match
+    top_k: int = 0
+    # "all" (headings and body) or "title" (headings only)
+    fields: str = ALL
+    # "section" (matched section IDs) or "page" (the PDF pages the terms occur on)
+    granularity: str = SECTION
+
+    @classmethod
+    def from_body(cls, body) -> "SearchOptions":
+        """Build from a JSON body or query params ("true"/"1" count as set)."""
+        return cls(
+            strict=_flag(body.get("strict", False)),
+            compact=_flag(body.get("compact", False)),
+            books=_books(body.get("books")),
+            top_k=_top_k(body.get("top_k")),
+            fields=str(body.get("fields") or ALL).strip().lower(),
+            granularity=str(body.get("granularity") or SECTION).strip().lower(),
+        )
+
+
+def canonical_query(query: str, options: SearchOptions) -> tuple:
+    """
+    Cache key for a query: its deduplicated, sorted stems plus the search options.
+
+    search2's result per word depends only on the word's stem, so "Risks risk"
+    and "risk" share one key. Boolean queries key on their normalized plan.
+    """
+    return (tuple(query_indexer.query_stems(query or "", options.strict)), options)
+
+
+# Stemming needs no book data, so cache keys never force a shard to load
+query_indexer = SearchEngine()
+
+
+def searched_targets(
+    query: str, options: SearchOptions, index_registry: IndexRegistry = registry
+) -> list[tuple[str, str]]:
+    """
+    book_targets minus the books a boolean query's ``book:`` filters rule
+    out; those shards are never searched (or loaded) for it.
+    """
+    targets = book_targets(index_registry, options.books)
+    if not is_boolean(query or ""):
+        return targets
+    tree = query_indexer.query_stems(query, options.strict)
+    if not tree:
+        return []
+    names = {
+        book.key: {book.key.lower(), book.base_name.lower()}
+        for book in index_registry.books
+    }
+    possible = possible_books(tree[0], names)
+    return [(key, base_name) for key, base_name in targets if key in possible]
+
+
+def section_entry(shard: BookShard, sid: str) -> dict:
+    # Printed page numbers in final_index are offset from the PDF page for some books
+    buffer = shard.page_offset
+    final_index = shard.final_index
+    return {
+        "section_id": sid,
+        "startText": final_index.get(sid, {}).get("startText", "Not Found"),
+        "PageNumber": buffer+int(final_index.get(sid, {}).get("PageNumber", 1)),
+    }
+
+
+def present_sections(shard: BookShard, section_ids, options: SearchOptions):
+    """Turn one book's matched section IDs into the hierarchy → AMT response."""
+    if not section_ids:
+        return {} if options.compact else []
+    hierarchy_sections = shard.indexer.return_hierarchy(section_ids)
+    if options.compact:
+        return hierarchy_sections
+
+    # Build list of dicts for matched section IDs
+    results = [section_entry(shard, sid) for sid in section_ids]
+
+    return build_amt_structure(hierarchy_sections, results)
+
+
+def search_book(shard: BookShard, query: str, options: SearchOptions, deadline=None):
+    """Run the full search → hierarchy → AMT pipeline for one book."""
+    if options.granularity == PAGE:
+        # Exact PDF pages straight from the page postings; no hierarchy to build
+        pages = shard.indexer.search_pages(
+            query,
+            match_all=options.strict,
+            fuzzy=options.fuzzy,
+            max_expansions=options.max_expansions,
+            deadline=deadline,
+        )
+        return pages.get(shard.name, [])
+
+    section_ids = shard.indexer.search2(
+        query,
+        match_all=options.strict,
+        fuzzy=options.fuzzy,
+        max_expansions=options.max_expansions,
+        deadline=deadline,
+        top_k=options.top_k,
+        fields=options.fields,
+        book_names=(shard.key,),
+    )
+    return present_sections(shard, section_ids.get(shard.name, None), options)
+
+
+def search_book_batch(shard: BookShard, items: list[tuple[str, SearchOptions]]) -> list:
+    """search_book for many queries in one pass over this book's index."""
+    # Queries only share stem lookups when they expand stems the same way
+    groups = defaultdict(list)
+    pages = {}
+    for position, (query, options) in enumerate(items):
+        if options.granularity == PAGE:
+            pages[position] = search_book(shard, query or "", options)
             continue
-        hierarchy_sections = indexer.return_hierarchy(section_ids)
-        final_index_path = final_index_folder / f"{base_name}_fileIndex.pkl"
-
-        final_index = None
-        with open(final_index_path, "rb") as f:
-            final_index = pickle.load(f)
-
-        # Build list of dicts for matched section IDs
-        buffer:int = 0
-        if base_name == "book1":
-            buffer = 80
-        if base_name == "book3":
-            buffer = 1
-        results = [
-            {
-                "section_id": sid,
-                "startText": final_index.get(sid, {}).get("startText", "Not Found"),
-                "PageNumber": buffer+int(final_index.get(sid, {}).get("PageNumber", 1)),
-            }
-            for sid in section_ids
-        ]
+        groups[(options.fuzzy, options.max_expansions, options.fields)].append(position)
+
+    matches = [None] * len(items)
+    for (fuzzy, max_expansions, fields), positions in groups.items():
+        found = shard.indexer.search_many(
+            [(items[p][0] or "", items[p][1].strict) for p in positions],
+            fuzzy=fuzzy,
+            max_expansions=max_expansions,
+            fields=fields,
+            book_names=(shard.key,),
+        )
+        for p, section_ids in zip(positions, found):
+            query, options = items[p]
+            if options.top_k > 0:
+                section_ids = shard.indexer.rank(
+                    query or "", section_ids, options.top_k, fuzzy, max_expansions, fields
+                )
+            matches[p] = section_ids
+
+    return [
+        pages[p] if p in pages else present_sections(shard, section_ids.get(shard.name, None), options)
+        for p, (section_ids, (_, options)) in enumerate(zip(matches, items))
+    ]
+
+
+def search_named_book(
+    index_registry: IndexRegistry, base_name: str, query: str, options: SearchOptions, deadline=None
+):
+    # Runs on a search thread, so a lazily loaded shard never blocks the event loop
+    return search_book(index_registry.get(base_name), query, options, deadline)
+
+
+def search_named_book_batch(index_registry: IndexRegistry, base_name: str, items) -> list:
+    return search_book_batch(index_registry.get(base_name), items)
 
-        # Build and save
-        result = build_amt_structure(hierarchy_sections, results)
-
-        if index == 0:
-            stucture["PMBook"]["sections"] = result
-        elif index == 1:
-            stucture["PRINCE2"]["sections"] = result
-        elif index == 2:
-            stucture["ISO"]["sections"] = result
-        # # os.makedirs("final_index", exist_ok=True)
-        # with open(f"{base_name}_amt.json", "w", encoding="utf-8") as f:
-        #     json.dump({"sections": result}, f, ensure_ascii=False, indent=2)
-
-        print(f"✅ AMT structured JSON saved → final_index/{base_name}_amt.json")
-
-        # function which will use section_ids list into [{where key = id[i] and : value = pkl load respective using filename and value againsta that key}]
-
-    return stucture
-
-    # sys.exit()
-    # results = indexer.display_search_results(query, match_all=True)
-
-    # # results = indexer.search(query)
-    # print(len(results))
-    # all_results[pkl_file.stem] = results
-
-    # # Display results nicely
-    # for index_name, result_list in all_results.items():
-    #     print(f"\n=== Results from {index_name} ===")
-    #     if not result_list:
-    #         print("  No matches found.")
-    #     else:
-    #         for r in result_list:
-    #             print(f"📘 {r['section']}")
-    #             for snippet in r['snippets']:
-    #                 print(f"   ↳ {snippet[:150]}...")
-    #             print("")
-
-    # # Optionally return as JSON
-    # output_json = json.dumps(all_results, indent=2)
-    # print("\n--- JSON Output ---\n")
-    # print(output_json)
+
+def build_toc_manifest(shard: BookShard) -> dict:
+    """
+    Every section a search of this book can return, with the title, cleaned
+    title and page that /data would otherwise repeat in each response.
+    """
+    sections = {}
+    for sid in shard.indexer.get_all_section_ids():
+        entry = section_entry(shard, sid)
+        sections[sid] = {
+            "title": entry["startText"],
+            "cleanTitle": clean_section_title(entry["startText"]),
+            "page": entry["PageNumber"],
+        }
+    return {"book": shard.name, "sections": sections}
+
+
+def main(
+    query: str,
+    strict_mode: bool,
+    index_registry: IndexRegistry = registry,
+    deadline=None,
+):
+    # Indexes are loaded once by the server's lifespan hook; CLI runs warm them here
+    if not index_registry.ready:
+        index_registry.load_all()
+
+    options = SearchOptions(strict=strict_mode)
+    data = new_structure(index_registry)
+    targets = searched_targets(query, options, index_registry)
+    print(f"🔍 Searching '{query}' across {len(targets)} indexes...\n")
+
+    futures = {
+        key: search_executor.submit(
+            search_named_book, index_registry, base_name, query, options, deadline
+        )
+        for key, base_name in targets
+    }
+    for (key, base_name), future in zip(targets, futures.values()):
+        if deadline is not None and deadline.expired() and future.cancel():
+            # Out of time between books: skip the ones that haven't started yet
+            deadline.truncated.add(base_name)
+        if not future.cancelled():
+            data[key]["sections"] = future.result()
+        if deadline is not None and base_name in deadline.truncated:
+            data[key]["truncated"] = True
+
+    return data
+
+
+async def run_book_search(
+    base_name: str,
+    query: str,
+    options: SearchOptions,
+    index_registry: IndexRegistry = registry,
+    shard_pool=None,
+    deadline=None,
+):
+    """
+    Search one book, on a shard worker process or the thread pool. Workers
+    only take searches pinned to the generation they loaded; during a hot
+    reload the rest run on threads against the pinned shards.
+    """
+    if shard_pool is not None and shard_pool.serves(index_registry.generation):
+        return await shard_pool.search_book(base_name, query, options, deadline)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor,
+        search_named_book,
+        index_registry,
+        base_name,
+        query,
+        options,
+        deadline,
+    )
+
+
+async def search(
+    query: str,
+    options: SearchOptions,
+    index_registry: IndexRegistry = registry,
+    shard_pool=None,
+    deadline=None,
+):
+    """
+    Async variant of main() that keeps the event loop free while books are searched.
+
+    With a deadline, books still running when it expires (or when the client
+    disconnects) are abandoned and returned empty with ``"truncated": True``.
+    """
+    data = new_structure(index_registry, options.books, options.granularity)
+    targets = searched_targets(query, options, index_registry)
+    field = result_key(options.granularity)
+
+    if deadline is None:
+        results = await asyncio.gather(
+            *(
+                run_book_search(base_name, query, options, index_registry, shard_pool)
+                for _, base_name in targets
+            )
+        )
+        for (key, _), sections in zip(targets, results):
+            data[key][field] = sections
+        return data
+
+    tasks = [
+        asyncio.ensure_future(
+            run_book_search(base_name, query, options, index_registry, shard_pool, deadline)
+        )
+        for _, base_name in targets
+    ]
+    watcher = asyncio.ensure_future(deadline.watch())
+    pending = set(tasks)
+    try:
+        while pending and not watcher.done():
+            _, pending = await asyncio.wait(
+                pending | {watcher}, return_when=asyncio.FIRST_COMPLETED
+            )
+            pending.discard(watcher)
+    finally:
+        watcher.cancel()
+        for task in pending:
+            task.cancel()
+
+    for (key, base_name), task in zip(targets, tasks):
+        if task in pending:
+            deadline.truncated.add(base_name)
+        else:
+            data[key][field] = task.result()
+        if base_name in deadline.truncated:
+            data[key]["truncated"] = True
+    return data
+
+
+async def search_batch(
+    items: list[tuple[str, SearchOptions]],
+    index_registry: IndexRegistry = registry,
+    shard_pool=None,
+) -> list[dict]:
+    """
+    Evaluate many queries against their books, one batched pass per book.
+    A book only evaluates the queries whose ``books`` filter (and ``book:``
+    filters) include it.
+    """
+    results = [
+        new_structure(index_registry, options.books, options.granularity) for _, options in items
+    ]
+    searched = [
+        {key for key, _ in searched_targets(query, options, index_registry)}
+        for query, options in items
+    ]
+    wanted = {
+        name: [p for p in range(len(items)) if key in searched[p]]
+        for key, name in book_targets(index_registry)
+    }
+    wanted = {name: positions for name, positions in wanted.items() if positions}
+
+    async def run_book_batch(base_name: str):
+        book_items = [items[p] for p in wanted[base_name]]
+        # Same worker/thread choice as run_book_search
+        if shard_pool is not None and shard_pool.serves(index_registry.generation):
+            return await shard_pool.search_book_batch(base_name, book_items)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            search_executor, search_named_book_batch, index_registry, base_name, book_items
+        )
+
+    per_book = await asyncio.gather(*(run_book_batch(name) for name in wanted))
+
+    keys = dict((name, key) for key, name in book_targets(index_registry))
+    for base_name, book_results in zip(wanted, per_book):
+        for p, sections in zip(wanted[base_name], book_results):
+            results[p][keys[base_name]][result_key(items[p][1].granularity)] = sections
+    return results
+
+
+async def search_as_completed(
+    query: str,
+    options: SearchOptions,
+    index_registry: IndexRegistry = registry,
+    shard_pool=None,
+):
+    """Yield (response key, sections) for each book as soon as its search finishes."""
+    targets = searched_targets(query, options, index_registry)
+
+    async def tagged(key, base_name):
+        sections = await run_book_search(
+            base_name, query, options, index_registry, shard_pool
+        )
+        return key, sections
+
+    tasks = [asyncio.ensure_future(tagged(key, name)) for key, name in targets]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: don't leave orphaned book searches behind
+        for task in tasks:
+            task.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,551 @@
+import difflib
+import pickle
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from bitmap_postings import BitmapPostings
+from config import FUZZY_MAX_DISTANCE
+from fields import ALL, TITLE, TitleField
+from fuzzy_index import FuzzyIndex
+from page_postings import PagePostings
+from positional_index import PositionalIndex
+from query_planner import PlanExecutor, compile_query, is_boolean, positive_clauses
+from query_syntax import Clause, clause_stems, parse, spans
+from ranking import TITLE_BOOST, BM25Stats, top_k as best_k
+from tokens import words
+
+# The query path must not pay for NLTK's import (hundreds of ms) on worker
+# start, so the Porter stemmer is only created when a word actually needs it
+_porter = None
+
+
+def porter_stem(word: str) -> str:
+    """Porter stem of one word; imports NLTK on first use."""
+    global _porter
+    if _porter is None:
+        from nltk.stem.porter import PorterStemmer
+
+        _porter = PorterStemmer()
+    return _porter.stem(word)
+
+
+class LazyStemmer:
+    """Stand-in for ``PorterStemmer`` that defers the NLTK import."""
+
+    def stem(self, word: str) -> str:
+        return porter_stem(word)
+
+
+class SearchEngine:
+    """
+    Query-time side of a book index: loads a built index (pickle or packed
+    mmap) and answers searches. Imports no PDF libraries and no NLTK, so
+    server workers start quickly; building indexes from PDFs lives in
+    create_index.PDFBookIndexer.
+    """
+
+    def __init__(self):
+        self.books = {}  # {book_name: {section_id: {title, content}}}
+        self.index = defaultdict(lambda: defaultdict(list))
+        self.stemmer = LazyStemmer()
+        self.stem_lookup = {}  # maps original words → stems
+        self.fuzzy: Optional[FuzzyIndex] = None  # candidate index for fuzzy matching
+        self.postings: Optional[BitmapPostings] = None  # bitmap copy of index for queries
+        self.bm25: Optional[BM25Stats] = None  # term frequencies / lengths, for ranking
+        self.positional: Optional[PositionalIndex] = None  # token positions, for phrase / NEAR
+        self.title: Optional[TitleField] = None  # title-only postings, for fields=title
+        self.pages: Optional[PagePostings] = None  # term → PDF pages, for granularity=page
+
+    def stem(self, word: str) -> str:
+        """
+        Stem of a lowercase query word. Indexed words are answered from the
+        index's own word → stem table, which was built with the same stemmer;
+        only words the book has never seen go to NLTK.
+        """
+        stem = self.stem_lookup.get(word)
+        return stem if stem is not None else self.stemmer.stem(word)
+
+    def get_section_hierarchy_list(self, book_name: str = ""):
+        """
+        Return all sections and subsections in order as a flat list of strings.
+        Example: ["1  Introduction", "1.1  Background", "2.4  Manage by exception"]
+        """
+        if not self.books:
+            return ["No books processed yet."]
+
+        # Choose which books to process
+        books_to_process = {book_name: self.books[book_name]} if book_name else self.books
+
+        result = []
+
+        for bname, sections in books_to_process.items():
+            # Sort section IDs naturally (1, 1.1, 1.2, 2, 2.1, etc.)
+            sorted_sections = sorted(
+                sections.keys(),
+                key=lambda x: [int(n) for n in x.split(".")]
+            )
+
+            for sid in sorted_sections:
+                title = sections[sid]["title"]
+                result.append(f"{sid}  {title}")
+
+        return result
+
+    def get_all_section_ids(self):
+        """
+        Return a flat, unique, naturally sorted list of all section IDs
+        from the entire book (assuming one book in index).
+        """
+        all_ids = set()
+
+        for term, books in self.index.items():
+            for book_name, sections in books.items():
+                all_ids.update(sections)  # add all section IDs for this term
+
+        # Convert to list and sort naturally (1, 1.1, 1.2, 2, 2.1, etc.)
+        sorted_ids = sorted(
+            all_ids,
+            key=lambda x: [int(n) for n in x.split(".") if n.isdigit()]
+        )
+
+        return sorted_ids
+
+    def load_index(self, pkl_path: str):
+        """Load an existing index (.pkl file)"""
+        with open(pkl_path, "rb") as f:
+            self.load_data(pickle.load(f))
+
+    def load_data(self, data: dict):
+        """Populate the indexer from an already unpickled index dict"""
+        self.books = data["books"]
+        self.index = defaultdict(lambda: defaultdict(list), data["index"])
+        self.stem_lookup = data["stem_lookup"]
+        # Indexes built before term frequencies were recorded get them on first ranked query
+        self.bm25 = None
+        if "term_freqs" in data:
+            self.bm25 = BM25Stats(data["term_freqs"], data["section_lengths"])
+        self.positional = PositionalIndex(data["positions"]) if "positions" in data else None
+        self.build_query_indexes()
+        # Headings are cheap to re-tokenize when the index predates title postings
+        if "title_freqs" in data:
+            stats = BM25Stats(data["title_freqs"], data["title_lengths"])
+        else:
+            stats = TitleField.stats_from_books(self.books, self.stem)
+        self.title = TitleField(stats, self.postings.sections, FUZZY_MAX_DISTANCE)
+        # Only indexes built with page postings can answer granularity=page
+        self.pages = PagePostings(data["page_postings"]) if "page_postings" in data else None
+
+    def load_mapped(self, packed):
+        """Serve queries straight from a memory-mapped PackedIndex (read-only)"""
+        self.books = packed.books
+        self.index = packed.index
+        self.stem_lookup = packed.stem_lookup
+        self.bm25 = packed.bm25_stats()
+        self.positional = packed.positional_index()
+        self.pages = PagePostings(packed.page_postings) if packed.page_postings is not None else None
+        self.build_query_indexes(packed.fuzzy_index(FUZZY_MAX_DISTANCE), packed.book_sections())
+        self.title = TitleField(packed.title_stats(), self.postings.sections, FUZZY_MAX_DISTANCE)
+
+    def build_query_indexes(self, fuzzy: Optional[FuzzyIndex] = None, sections: Optional[Dict[str, List[str]]] = None):
+        """
+        (Re)build the bitmap postings over ``index`` (numbered by ``sections``
+        if given), and the fuzzy candidate index unless a prebuilt (mapped)
+        one is given.
+        """
+        self.fuzzy = fuzzy if fuzzy is not None else FuzzyIndex(self.index.keys(), FUZZY_MAX_DISTANCE)
+        self.postings = BitmapPostings(self.index, sections)
+
+    def search(self, query: str, max_results: int = 5):
+        """Search across this single index"""
+        query_words = query.lower().split()
+        results = defaultdict(list)
+
+        for word in query_words:
+            stem = self.stem(word)
+            # Find fuzzy matches among stems
+            possible_stems = self._find_similar_stems(stem, cutoff=0.7, n=3)
+            for ps in possible_stems:
+                for book_name, section_ids in self.index[ps].items():
+                    for sid in section_ids:
+                        title = self.books[book_name][sid]["title"]
+                        snippet = self.books[book_name][sid]["content"][:200].replace('\n', ' ')
+                        results[f"{book_name} - {sid} {title}"].append(snippet)
+
+        # Format results
+        formatted = []
+        for key, snippets in results.items():
+            formatted.append({
+                "section": key,
+                "snippets": snippets[:max_results]
+            })
+        return formatted
+
+    @staticmethod
+    def match_sections(hierarchy_list, section_ids):
+        """
+        Match section IDs to entries in the hierarchy list.
+        Returns:
+            dict[str, dict[str, int | str]] like:
+            {
+                "10.3.1.1": {
+                    "title": "10.3.1.1  Details",
+                    "index": 3
+                }
+            }
+        """
+        matches = {}
+
+        for entry in hierarchy_list:
+            # Split "1.1  Title" → ("1.1", "Title")
+            parts = entry.split("  ", 1)
+            if len(parts) < 2:
+                continue
+            sid, title = parts
+
+            if sid in section_ids:
+                matches[sid] = {
+                    "title": entry,
+                }
+                
+        try:
+            sorted_matches = dict(
+                sorted(
+                    matches.items(),
+                    key=lambda x: [int(n) for n in x[0].split(".")]  # natural sort by numeric parts
+                )
+            )
+
+            return sorted_matches
+        except Exception:
+            return matches
+    
+    @staticmethod
+    def tokenize(query: str) -> List[str]:
+        """Split a query into the lowercase words search2 looks up (3+ letters)."""
+        return words(query)
+
+    def parse(self, query: str) -> List[Clause]:
+        """Query clauses: word stems, plus quoted phrases and NEAR/k pairs (see query_syntax)."""
+        return parse(query, self.stem)
+
+    def query_stems(self, query: str, match_all: bool = False) -> list:
+        """
+        Canonical form of a query: its deduplicated, sorted clauses. For a
+        plain query that is just its Porter stems; a boolean query is its
+        single normalized plan tree (see query_planner).
+        """
+        if is_boolean(query):
+            tree = compile_query(query, self.stem, match_all)
+            return [tree] if tree is not None else []
+        clauses = set(self.parse(query))
+        words = sorted(clause for clause in clauses if isinstance(clause, str))
+        return words + sorted((clause for clause in clauses if not isinstance(clause, str)), key=repr)
+
+    def _find_similar_keywords(self, word: str, cutoff: float = 0.8) -> List[str]:
+        """Return fuzzy-matched stems for the given word."""
+        return self._find_similar_stems(self.stem(word), cutoff)
+
+    def _find_similar_stems(self, stem: str, cutoff: float = 0.8, n: int = 5) -> List[str]:
+        if self.fuzzy is not None:
+            return self.fuzzy.close_matches(stem, n=n, cutoff=cutoff)
+        # Index still being built (PDFBookIndexer): scan the vocabulary
+        return difflib.get_close_matches(stem, list(self.index.keys()), n=n, cutoff=cutoff)
+
+    def title_field(self) -> TitleField:
+        if self.postings is None:
+            self.build_query_indexes()
+        if self.title is None:
+            stats = TitleField.stats_from_books(self.books, self.stem)
+            self.title = TitleField(stats, self.postings.sections, FUZZY_MAX_DISTANCE)
+        return self.title
+
+    def field_postings(self, field: str = ALL) -> BitmapPostings:
+        if field == TITLE:
+            return self.title_field().postings
+        if self.postings is None:
+            self.build_query_indexes()
+        return self.postings
+
+    def expand(self, stem: str, fuzzy: bool = True, max_expansions: int = 5, field: str = ALL) -> List[str]:
+        """The stems one query stem is looked up as: itself plus its fuzzy expansions."""
+        stems_to_search = [stem]
+        if fuzzy and max_expansions > 0:
+            if field == TITLE:
+                # Expand against the (much smaller) heading vocabulary only
+                stems_to_search.extend(self.title_field().fuzzy.close_matches(stem, n=max_expansions))
+            else:
+                stems_to_search.extend(self._find_similar_stems(stem, n=max_expansions))
+        return stems_to_search
+
+    def stem_postings(self, stem: str, fuzzy: bool = True, max_expansions: int = 5, field: str = ALL) -> Dict[str, int]:
+        """Section bitmaps matching one query stem (plus its fuzzy expansions), per book."""
+        postings = self.field_postings(field)
+        word_results = {}
+        for s in self.expand(stem, fuzzy, max_expansions, field):
+            for book, bits in postings.get(s).items():
+                word_results[book] = word_results.get(book, 0) | bits
+        return word_results
+
+    def positional_index(self) -> PositionalIndex:
+        if self.positional is None:
+            self.positional = PositionalIndex.from_books(self.books, self.stem)
+        return self.positional
+
+    def clause_postings(self, clause: Clause, fuzzy: bool = True, max_expansions: int = 5, field: str = ALL) -> Dict[str, int]:
+        """
+        Section bitmaps matching one query clause in ``field``, per book.
+        Phrase and NEAR clauses match their words exactly (no fuzzy
+        expansion): candidates are the sections holding every word (a bitmap
+        AND), which are then verified against the words' token positions.
+        """
+        if isinstance(clause, str):
+            return self.stem_postings(clause, fuzzy, max_expansions, field)
+        postings = self.field_postings(field)
+
+        stems = clause_stems(clause)
+        candidates = dict(postings.get(stems[0]))
+        for stem in stems[1:]:
+            found = postings.get(stem)
+            candidates = {book: bits & found.get(book, 0) for book, bits in candidates.items()}
+
+        positional = self.positional_index()
+        results = {}
+        for book, bits in candidates.items():
+            verified = []
+            for sid in self.decode(book, bits):
+                matched = spans(clause, positional.section_positions(book, sid))
+                if field == TITLE:
+                    # A heading's tokens are the first positions of its section
+                    title_length = self.title.title_length(book, sid)
+                    matched = [span for span in matched if span[1] < title_length]
+                if matched:
+                    verified.append(sid)
+            if verified:
+                results[book] = self.postings.encode(book, verified)
+        return results
+
+    def combine_postings(self, per_word: List[Dict[str, int]], match_all: bool = False) -> Dict[str, List[str]]:
+        """AND / OR the per-word section bitmaps and return sorted section lists."""
+        all_results = {}
+
+        for position, word_results in enumerate(per_word):
+            # Seed from the first word only; a first word with no hits must
+            # still empty an AND query, so results never depend on word order.
+            # Bitmaps are immutable ints, so sharing them between queries is safe.
+            if position == 0:
+                all_results = dict(word_results)
+            elif match_all:
+                for book in all_results:
+                    all_results[book] &= word_results.get(book, 0)  # AND
+            else:
+                for book, bits in word_results.items():
+                    all_results[book] = all_results.get(book, 0) | bits  # OR
+
+        # Decode bitmaps back to (sorted) section IDs
+        return {b: self.decode(b, bits) for b, bits in all_results.items() if bits}
+
+    def evaluate_plan(self, tree, fuzzy: bool = True, max_expansions: int = 5, deadline=None, fields: str = ALL, book_names: Tuple[str, ...] = (), memo: Optional[dict] = None) -> Dict[str, List[str]]:
+        """
+        Matches of a compiled boolean query (query_planner.compile_query).
+        ``book_names`` are extra names (the response key) a ``book:`` filter
+        may use for this index's books. ``memo`` shares clause postings
+        between the queries of a batch.
+        """
+        if tree is None:
+            return {}
+        memo = {} if memo is None else memo
+
+        def clause_postings(clause):
+            if clause not in memo:
+                memo[clause] = self.clause_postings(clause, fuzzy, max_expansions, fields)
+            return memo[clause]
+
+        postings = self.field_postings(fields)
+        names = {name.lower() for name in book_names}
+        results = {}
+        for book in postings.sections:
+            plan = PlanExecutor(postings, book, names | {book.lower()}, clause_postings, deadline)
+            bits, _ = plan.run(tree)
+            if plan.truncated:
+                deadline.truncated.add(book)
+            if bits:
+                results[book] = self.decode(book, bits)
+        return results
+
+    def decode(self, book: str, bits: int) -> List[str]:
+        """Sorted section IDs for a section bitmap returned by ``stem_postings``."""
+        return self.postings.decode(book, bits)
+
+    def bm25_stats(self) -> BM25Stats:
+        if self.bm25 is None:
+            self.bm25 = BM25Stats.from_books(self.books, self.stem)
+        return self.bm25
+
+    def rank(self, query: str, matches: Dict[str, List[str]], top_k: int, fuzzy: bool = True, max_expansions: int = 5, field: str = ALL) -> Dict[str, List[str]]:
+        """
+        Keep the ``top_k`` BM25-best matched sections per book, best first.
+        Title searches rank by heading BM25 alone; otherwise the heading
+        score is added on top with weight TITLE_BOOST.
+        """
+        if is_boolean(query):
+            # NOT-ed terms and filters don't make a section more relevant
+            clauses = positive_clauses(compile_query(query, self.stem))
+        else:
+            clauses = self.parse(query)
+        word_terms = []
+        for clause in dict.fromkeys(clauses):
+            if isinstance(clause, str):
+                word_terms.append(self.expand(clause, fuzzy, max_expansions, field))
+            else:
+                # Phrase / NEAR words matched exactly; each scores on its own
+                word_terms.extend([stem] for stem in clause_stems(clause))
+
+        title_stats = self.title_field().bm25
+        ranked = {}
+        for book, section_ids in matches.items():
+            title_scores = title_stats.scores(book, word_terms)
+            if field == TITLE:
+                scores = title_scores
+            else:
+                scores = self.bm25_stats().scores(book, word_terms)
+                for sid, score in title_scores.items():
+                    scores[sid] += TITLE_BOOST * score
+            ranked[book] = best_k(section_ids, scores, top_k)
+        return ranked
+
+    def search2(self, query: str, match_all: bool = False, fuzzy: bool = True, max_expansions: int = 5, deadline=None, top_k: int = 0, fields: str = ALL, book_names: Tuple[str, ...] = ()) -> Dict[str, List[str]]:
+        """
+        Enhanced search:
+          - Multi-word queries, "quoted phrases" and NEAR/k proximity pairs
+          - Boolean queries: AND / OR / NOT, parentheses, book: / section: filters
+          - Optional fuzzy matching (up to max_expansions similar stems per word)
+          - Optional AND logic (match_all=True)
+          - Optional deadline, checked before each query term
+          - Optional ranking: only the top_k BM25-best sections per book, best first
+          - Optional fields="title": match section headings only
+        """
+        if is_boolean(query):
+            tree = compile_query(query, self.stem, match_all)
+            results = self.evaluate_plan(tree, fuzzy, max_expansions, deadline, fields, book_names)
+            if top_k > 0:
+                results = self.rank(query, results, top_k, fuzzy, max_expansions, fields)
+            return results
+
+        per_word = []
+        for clause in self.parse(query):
+            if deadline is not None and deadline.expired():
+                # Stopped early: every book here gets a partial answer. OR hits
+                # so far are real matches; an AND over a subset of the words is
+                # not, so a truncated AND query returns nothing.
+                deadline.truncated.update(self.books)
+                if match_all:
+                    return {}
+                break
+            per_word.append(self.clause_postings(clause, fuzzy, max_expansions, fields))
+        results = self.combine_postings(per_word, match_all)
+        if top_k > 0:
+            results = self.rank(query, results, top_k, fuzzy, max_expansions, fields)
+        return results
+
+    def search_pages(self, query: str, match_all: bool = False, fuzzy: bool = True, max_expansions: int = 5, deadline=None) -> Dict[str, List[int]]:
+        """
+        PDF pages (sorted) where the query's terms occur, per book; the page
+        counterpart of search2, answered from the page postings alone.
+        Phrase and NEAR clauses match pages holding all of their words.
+        """
+        if self.pages is None:
+            raise ValueError("this index was built without page postings")
+        per_word = []
+        for clause in self.parse(query):
+            if deadline is not None and deadline.expired():
+                deadline.truncated.update(self.books)
+                if match_all:
+                    return {}
+                break
+            if isinstance(clause, str):
+                word_results = {}
+                for s in self.expand(clause, fuzzy, max_expansions):
+                    for book, bits in self.pages.get(s).items():
+                        word_results[book] = word_results.get(book, 0) | bits
+            else:
+                stems = clause_stems(clause)
+                word_results = dict(self.pages.get(stems[0]))
+                for stem in stems[1:]:
+                    found = self.pages.get(stem)
+                    word_results = {book: bits & found.get(book, 0) for book, bits in word_results.items()}
+            per_word.append(word_results)
+
+        all_results = {}
+        for position, word_results in enumerate(per_word):
+            if position == 0:
+                all_results = dict(word_results)
+            elif match_all:
+                all_results = {book: bits & word_results.get(book, 0) for book, bits in all_results.items()}
+            else:
+                for book, bits in word_results.items():
+                    all_results[book] = all_results.get(book, 0) | bits
+        return {book: self.pages.decode(bits) for book, bits in all_results.items() if bits}
+
+    def search_many(self, queries: List[Tuple[str, bool]], fuzzy: bool = True, max_expansions: int = 5, fields: str = ALL, book_names: Tuple[str, ...] = ()) -> List[Dict[str, List[str]]]:
+        """
+        search2 for many (query, match_all) pairs in one pass: every distinct
+        clause is expanded and looked up once, however many queries use it.
+        """
+        shared = {}
+        results = []
+        for query, match_all in queries:
+            if is_boolean(query):
+                tree = compile_query(query, self.stem, match_all)
+                results.append(self.evaluate_plan(tree, fuzzy, max_expansions, None, fields, book_names, shared))
+                continue
+            per_word = []
+            for clause in self.parse(query):
+                if clause not in shared:
+                    shared[clause] = self.clause_postings(clause, fuzzy, max_expansions, fields)
+                per_word.append(shared[clause])
+            results.append(self.combine_postings(per_word, match_all))
+        return results
+
+    @staticmethod
+    def return_hierarchy(data:List):
+        parent_map = defaultdict(list)
+
+        # First pass: Group by 2-level prefix
+        for item in data:
+            parts = item.split(".")
+            if len(parts) >= 2:
+                parent_key = ".".join(parts[:2])
+            else:
+                parent_key = item  # e.g. '70'
+
+            parent_map[parent_key].append(item)
+
+        # Ensure each parent exists even if it has no children
+        for item in data:
+            parts = item.split(".")
+            if len(parts) == 2:
+                parent_key = item
+                parent_map[parent_key]  # triggers defaultdict
+
+        # Convert to dict if needed
+        result = dict(parent_map)
+        return result
+    
+    def display_search_results(self, query: str, **kwargs):
+        results = self.search2(query, **kwargs)
+        print(f"\n{'='*80}")
+        print(f"Search Results for: '{query}'")
+        print(f"{'='*80}\n")
+
+        if not results:
+            print("No results found.")
+            return
+
+        for book, sections in results.items():
+            # print("Result",len(results))
+            
+            print(f"\n📘 {book}")
+        #     for sid in sorted(sections, key=lambda x: [int(n) for n in x.split('.')]):
+        #         title = self.books[book].get(sid, {}).get('title', 'Unknown')
+        #         print(f"   • Section {sid}: {title}")
+        # print(f"\n{'='*80}\n")
@@ -1,11 +1,188 @@
-from fastapi import FastAPI, Request
+import asyncio
+import dataclasses
+import functools
+import hashlib
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
-from runner import main
+from fastapi.responses import JSONResponse
+from typing import Optional
+from runner import (
+    SearchOptions,
+    book_targets,
+    build_toc_manifest,
+    canonical_query,
+    new_structure,
+    result_key,
+    search,
+    search_as_completed,
+    search_batch,
+)
+from admission import (
+    CAPPED_FUZZY,
+    EXACT_ONLY,
+    FULL,
+    LEVEL_NAMES,
+    AdmissionController,
+    Overloaded,
+)
+from config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    BATCH_MAX_QUERIES,
+    DEGRADE_P95_MS,
+    DEGRADE_QUEUE_DEPTH,
+    PRECOMPUTED_STORE_PATH,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+    RELOAD_POLL_SECONDS,
+    SEARCH_MODE,
+    SEVERE_P95_MS,
+    SEVERE_QUEUE_DEPTH,
+    WARM_BOOKS,
+)
+from deadline import Deadline
+from fields import ALL, FIELDS
+from index_registry import IndexGeneration, registry
+from live_search import LiveSearchSession
+from page_postings import GRANULARITIES, PAGE, SECTION
+from precompute import PrecomputedStore
+from query_cache import QueryCache
+from query_planner import is_boolean
+from search_engine import porter_stem
+from responses import (
+    etag_matches,
+    json_response,
+    ndjson_response,
+    not_modified,
+    render_json,
+    representation_etag,
+)
+from shard_pool import ShardWorkerPool
+from suggest import SuggestIndex
+
+query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
+admission = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    DEGRADE_QUEUE_DEPTH,
+    SEVERE_QUEUE_DEPTH,
+    DEGRADE_P95_MS,
+    SEVERE_P95_MS,
+)
 from routes import auth_routes
 
-app = FastAPI(title="PM Codex API")
+
+async def warm_books(index: IndexGeneration, shard_pool: Optional[ShardWorkerPool]):
+    """Load the first WARM_BOOKS books (or all of them) in parallel, in the process that serves them."""
+    names = index.names()[:WARM_BOOKS or None]
+    if shard_pool is not None:
+        await asyncio.gather(*(shard_pool.warm(name) for name in names))
+    else:
+        await asyncio.gather(*(asyncio.to_thread(index.get, name) for name in names))
+
+
+async def build_suggest(index: IndexGeneration, shard_pool: Optional[ShardWorkerPool]) -> SuggestIndex:
+    # Warm-up already cached every book in this process unless workers serve
+    # them or WARM_BOOKS limits it; then each book is read once and dropped
+    load = index.load if shard_pool is not None or WARM_BOOKS else None
+    return await asyncio.to_thread(SuggestIndex.build, index, load)
+
+
+async def warm_up(app: FastAPI):
+    await asyncio.to_thread(registry.load_all)
+    index = registry.snapshot()
+    app.state.precomputed = PrecomputedStore.open_for(index, PRECOMPUTED_STORE_PATH)
+    if SEARCH_MODE == "process":
+        app.state.shard_pool = ShardWorkerPool(index)
+        await app.state.shard_pool.start()
+    # Books beyond WARM_BOOKS load on first use
+    await warm_books(index, app.state.shard_pool)
+    app.state.suggest = await build_suggest(index, app.state.shard_pool)
+    # NLTK is imported lazily so workers start fast; pull it in now, off the
+    # request path, for the first query word a book hasn't indexed
+    await asyncio.to_thread(porter_stem, "warm")
+    app.state.warm = True
+    if RELOAD_POLL_SECONDS > 0:
+        app.state.index_reload = asyncio.create_task(watch_generations(app))
+
+
+async def reload_indexes(app: FastAPI) -> Optional[str]:
+    """
+    Load, validate and warm the newest published index generation, then swap
+    it in. Requests already running keep their pinned generation (and the
+    old shard workers drain before they exit); new requests see the new one.
+    """
+    candidate = await asyncio.to_thread(registry.load_newer)
+    if candidate is None:
+        return None
+
+    # load_newer already loaded and probed every book; warming loads them
+    # again where they will be served (and starts their workers)
+    shard_pool = None
+    if SEARCH_MODE == "process":
+        shard_pool = ShardWorkerPool(candidate)
+        await shard_pool.start()
+    try:
+        await warm_books(candidate, shard_pool)
+        suggest_index = await build_suggest(candidate, shard_pool)
+    except Exception as e:
+        if shard_pool is not None:
+            shard_pool.shutdown()
+        registry.rejected[candidate.label] = str(e)
+        print(f"⚠️ Rejected index generation {candidate.label}: {e}")
+        return None
+    precomputed = PrecomputedStore.open_for(candidate, PRECOMPUTED_STORE_PATH)
+
+    # No await from here to the prints: the swap is atomic for every request
+    old_pool, old_precomputed = app.state.shard_pool, app.state.precomputed
+    registry.swap(candidate)
+    app.state.shard_pool = shard_pool
+    app.state.precomputed = precomputed
+    app.state.suggest = suggest_index
+    print(f"🔄 Swapped in index generation {candidate.label} ({candidate.generation})")
+
+    if old_precomputed is not None:
+        old_precomputed.close()
+    if old_pool is not None:
+        await old_pool.retire()
+    return candidate.generation
+
+
+async def watch_generations(app: FastAPI):
+    """Poll the generations folder and hot-swap newly published indexes."""
+    while True:
+        await asyncio.sleep(RELOAD_POLL_SECONDS)
+        try:
+            await reload_indexes(app)
+        except Exception as e:
+            print(f"⚠️ Index reload failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background, so /health/ready can report progress while
+    # the catalog and the first books are being loaded.
+    app.state.warm = False
+    app.state.shard_pool = None
+    app.state.precomputed = None
+    app.state.suggest = None
+    app.state.index_reload = None
+    app.state.index_warmup = asyncio.create_task(warm_up(app))
+    yield
+    app.state.index_warmup.cancel()
+    if app.state.index_reload is not None:
+        app.state.index_reload.cancel()
+    if app.state.shard_pool is not None:
+        app.state.shard_pool.shutdown()
+    if app.state.precomputed is not None:
+        app.state.precomputed.close()
+
+
+app = FastAPI(title="PM Codex API", lifespan=lifespan)
 app.include_router(auth_routes.router)
 
 # CORS configuration (allow your frontend origin during dev)
@@ -24,440 +201,520 @@ app.add_middleware(
 
 # uvicorn server:app --reload
 
+
+def is_ready() -> bool:
+    # Every startup step (indexes, precomputed store, shard workers) has finished
+    return getattr(app.state, "warm", False) and registry.ready
+
+
+async def wait_for_indexes() -> IndexGeneration:
+    """
+    Block a request until the startup warm-up has finished, then pin the
+    index generation it will use throughout (hot reloads don't affect it).
+    """
+    if not is_ready():
+        warmup = getattr(app.state, "index_warmup", None)
+        if warmup is not None:
+            await warmup
+        else:
+            await asyncio.to_thread(registry.load_all)
+    return registry.snapshot()
+
+
+@app.get("/health/live")
+async def live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def ready():
+    # Load balancers should only route traffic here once the warm-up books
+    # are loaded (every book unless WARM_BOOKS says otherwise)
+    status_code = 200 if is_ready() else 503
+    content = dict(registry.status(), ready=is_ready(), mode=SEARCH_MODE)
+    return JSONResponse(status_code=status_code, content=content)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return query_cache.stats()
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return admission.stats()
+
+
+def overloaded() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Search is overloaded, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def degraded_options(options: SearchOptions, level: int) -> SearchOptions:
+    """Cheaper search options for the admission level a request ran at."""
+    if level == CAPPED_FUZZY:
+        return dataclasses.replace(options, max_expansions=min(options.max_expansions, 2))
+    if level == EXACT_ONLY:
+        return dataclasses.replace(options, fuzzy=False)
+    return options
+
+
+def degradation_headers(level: int) -> dict:
+    """Which rung of the degradation ladder a response was computed at (0 / "none" included)."""
+    return {"X-Degradation-Level": str(level), "X-Degradation": LEVEL_NAMES[level]}
+
+
+def lookup_response(cache_key: tuple, generation: str):
+    """Return (body bytes, X-Cache status) from the query cache or precomputed store."""
+    content = query_cache.get(cache_key, generation)
+    if content is not None:
+        return content, "HIT"
+    stems, options = cache_key
+    precomputed = getattr(app.state, "precomputed", None)
+    if (
+        precomputed is not None
+        and precomputed.generation == generation
+        and not options.compact
+        and not options.books  # precomputed bodies cover every book
+        and not options.top_k  # ... and every match, unranked
+        and options.fields == ALL
+        and options.granularity == SECTION
+    ):
+        # Single-term queries are answered by one key-value lookup
+        content = precomputed.get(stems)
+        if content is not None:
+            return content, "PRECOMPUTED"
+    return None, "MISS"
+
+
+async def toc_url(key: str, index: IndexGeneration) -> str:
+    # The first manifest of a book may have to load its shard: off the event loop
+    version, _ = await asyncio.to_thread(toc_manifest, key, index)
+    return f"/books/{key}/toc?v={version}"
+
+
+async def finalize(data: dict, options: SearchOptions, index: IndexGeneration) -> dict:
+    if options.compact:
+        for key, book in data.items():
+            book["toc"] = await toc_url(key, index)
+    return data
+
+
+def query_etag(cache_key: tuple, generation: str) -> str:
+    """Response identity: same index generation + same canonical query → same body."""
+    return hashlib.sha256(f"{generation}|{cache_key!r}".encode()).hexdigest()[:32]
+
+
+def check_options(options: SearchOptions, index: IndexGeneration):
+    """422 for a ``books`` filter naming books that aren't in the catalog, or an unknown field."""
+    unknown = set(options.books) - {book.key for book in index.books}
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown books: {sorted(unknown)}")
+    if options.fields not in FIELDS:
+        raise HTTPException(status_code=422, detail=f"fields must be one of {list(FIELDS)}")
+    if options.granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=422, detail=f"granularity must be one of {list(GRANULARITIES)}"
+        )
+
+
+async def check_granularity(query: str, options: SearchOptions, index: IndexGeneration):
+    """
+    422 for a granularity=page search that can't be answered from page
+    postings: ranked, title-only or boolean queries, or books whose index
+    was built before page postings were recorded.
+    """
+    if options.granularity != PAGE:
+        return
+    if options.top_k or options.fields != ALL or is_boolean(query or ""):
+        raise HTTPException(
+            status_code=422,
+            detail="granularity=page supports plain, phrase and NEAR queries without top_k or fields",
+        )
+
+    def missing_page_postings():
+        # Loads the shards, which the search itself is about to do anyway
+        return [
+            key
+            for key, base_name in book_targets(index, options.books)
+            if index.get(base_name).indexer.pages is None
+        ]
+
+    missing = await asyncio.to_thread(missing_page_postings)
+    if missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"No page postings for {missing}; rebuild these indexes with create_index.py",
+        )
+
+
+def request_deadline(request: Request, budget_ms=None) -> Deadline:
+    """Deadline from the X-Deadline-Ms header, else the body's deadline_ms."""
+    budget_ms = request.headers.get("x-deadline-ms", budget_ms)
+    return Deadline.after_ms(budget_ms, request)
+
+
+async def respond(request: Request, query: str, options: SearchOptions, deadline: Deadline):
+    index = await wait_for_indexes()
+    check_options(options, index)
+    await check_granularity(query, options, index)
+
+    generation = index.generation
+    cache_key = canonical_query(query, options)
+    headers = {
+        "ETag": representation_etag(request, query_etag(cache_key, generation)),
+        "Cache-Control": "private, no-cache",
+        # Cached bodies are full-quality: degraded ones are cached under their own key
+        **degradation_headers(FULL),
+    }
+    # Revalidation is answered before any cache lookup or search work
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+
+    content, cache_status = lookup_response(cache_key, generation)
+    if content is None:
+        try:
+            ticket = admission.enter()
+        except Overloaded:
+            return overloaded()
+        async with ticket:
+            # A degraded body is a different representation: it gets its own
+            # cache key and ETag, so it never answers a full-quality request
+            options = degraded_options(options, ticket.level)
+            if ticket.level != FULL:
+                cache_key = canonical_query(query, options)
+                headers["ETag"] = representation_etag(
+                    request, query_etag(cache_key, generation)
+                )
+            headers.update(degradation_headers(ticket.level))
+            data = await search(
+                query,
+                options,
+                index,
+                shard_pool=getattr(app.state, "shard_pool", None),
+                deadline=deadline,
+            )
+        content = render_json(await finalize(data, options, index))
+        if deadline.truncated:
+            # A partial body must never be replayed from a cache or revalidated
+            del headers["ETag"]
+            headers["Cache-Control"] = "no-store"
+            headers["X-Search-Truncated"] = "true"
+        else:
+            query_cache.put(cache_key, generation, content)
+
+    headers["X-Cache"] = cache_status
+    return json_response(request, content, headers=headers)
+
+
 @app.post("/data")
 async def get_data(request: Request):
+    """
+    Search every book. An optional time budget ("deadline_ms" in the body or
+    an X-Deadline-Ms header) stops the search early; so does the client
+    disconnecting. Books cut short carry "truncated": true.
+    """
+    body = await request.json()
+    deadline = request_deadline(request, body.get("deadline_ms"))
+    return await respond(request, body.get("query"), SearchOptions.from_body(body), deadline)
+
+
+@app.get("/data")
+async def get_data_cacheable(request: Request, query: str = "", deadline_ms: Optional[float] = None):
+    """GET twin of POST /data so browsers revalidate with If-None-Match on their own."""
+    deadline = request_deadline(request, deadline_ms)
+    return await respond(
+        request, query, SearchOptions.from_body(request.query_params), deadline
+    )
+
+
+@app.post("/data/batch")
+async def get_data_batch(request: Request):
+    """
+    Many /data queries in one call: {"queries": [{"query", "strict", "compact"}, ...]}.
+    Cached queries are answered from the cache; the rest are stemmed and
+    evaluated together, one pass per book. Returns {"results": [...]} with one
+    /data body per query, in request order.
+    """
+    body = await request.json()
+    queries = body.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+        raise HTTPException(status_code=422, detail="'queries' must be a list of objects")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=422, detail=f"At most {BATCH_MAX_QUERIES} queries per batch"
+        )
+    index = await wait_for_indexes()
+
+    generation = index.generation
+    items = [(q.get("query") or "", SearchOptions.from_body(q)) for q in queries]
+    for query, options in items:
+        check_options(options, index)
+        await check_granularity(query, options, index)
+    cache_keys = [canonical_query(query, options) for query, options in items]
+    bodies = [lookup_response(key, generation)[0] for key in cache_keys]
+
+    # Identical canonical queries in one batch are evaluated once
+    missing = {}
+    for position, (key, content) in enumerate(zip(cache_keys, bodies)):
+        if content is None:
+            missing.setdefault(key, position)
+    headers = {"X-Batch-Computed": str(len(missing)), **degradation_headers(FULL)}
+    if missing:
+        try:
+            ticket = admission.enter()
+        except Overloaded:
+            return overloaded()
+        # The whole batch is one admitted unit and runs at one level
+        async with ticket:
+            todo = [
+                (query, degraded_options(options, ticket.level))
+                for query, options in (items[position] for position in missing.values())
+            ]
+            results = await search_batch(
+                todo, index, shard_pool=getattr(app.state, "shard_pool", None)
+            )
+        headers.update(degradation_headers(ticket.level))
+        computed = {}
+        for key, (query, options), data in zip(missing, todo, results):
+            computed[key] = render_json(await finalize(data, options, index))
+            query_cache.put(canonical_query(query, options), generation, computed[key])
+        bodies = [content or computed[key] for key, content in zip(cache_keys, bodies)]
+
+    # Bodies are already serialized; splice them instead of re-encoding
+    content = b'{"results":[' + b",".join(bodies) + b"]}"
+    return json_response(request, content, headers=headers)
+
+
+def ndjson_frame(frame: dict) -> bytes:
+    return render_json(frame) + b"\n"
+
+
+@app.post("/data/stream")
+async def stream_data(request: Request):
+    """
+    NDJSON variant of /data: one {"type": "book"} frame per book, emitted as
+    soon as that book's search finishes, then a {"type": "summary"} frame.
+    """
     body = await request.json()
     query = body.get("query")
-    strict = body.get("strict", False)
-    # Fake data from backend
-    data = main(query, strict)
-    print(data)
-    return data
-    return {
-        "PMBook": {
-            "name": "PMBOK Guide",
-            "icon": "BookOpen",  # Optional: Just a string identifier
-            "color": "indigo",
-            "sections": [
-                {
-                    "id": 1,
-                    "number": "1.2",
-                    "title": "RELATIONSHIP OF THE PMBOK® GUIDE",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "1.2",
-                            "page": 2,
-                            "title": "1.2 RELATIONSHIP OF THE PMBOK® GUIDE",
-                        }
-                    ],
-                },
-                {
-                    "id": 2,
-                    "number": "2",
-                    "title": "The Standard for Program Management",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "2",
-                            "page": 215,
-                            "title": "2 The Standard for Program Management – Fourth Edition and The Standard for Portfolio Management –",
-                        }
-                    ],
-                },
-                {
-                    "id": 3,
-                    "number": "2.2",
-                    "title": "Chapter 2 Section 2",
-                    "count": 2,
-                    "subsections": [
-                        {"section": "2.2.2", "page": 18, "title": "2.2.2 PROJECT TEAM"},
-                        {
-                            "section": "2.2.4.4",
-                            "page": 23,
-                            "title": "2.2.4.4 Interpersonal",
-                        },
-                    ],
-                },
-                {
-                    "id": 4,
-                    "number": "2.3",
-                    "title": "Chapter 2 Section 3",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "2.3.6",
-                            "page": 40,
-                            "title": "2.3.6 ALIGNING OF DELIVERY CADENCE,",
-                        }
-                    ],
-                },
-                {
-                    "id": 5,
-                    "number": "2.5",
-                    "title": "PROJECT WORK PERFORMANCE",
-                    "count": 3,
-                    "subsections": [
-                        {
-                            "section": "2.5",
-                            "page": 61,
-                            "title": "2.5 PROJECT WORK PERFORMANCE",
-                        },
-                        {"section": "2.5.1", "page": 62, "title": "2.5.1 PROJECT"},
-                        {
-                            "section": "2.5.8",
-                            "page": 68,
-                            "title": "2.5.8 LEARNING THROUGHOUT THE",
-                        },
-                    ],
-                },
-                {
-                    "id": 6,
-                    "number": "2.8",
-                    "title": "Chapter 2 Section 8",
-                    "count": 1,
-                    "subsections": [
-                        {"section": "2.8.5.4", "page": 111, "title": "2.8.5.4 Risk"}
-                    ],
-                },
-                {
-                    "id": 7,
-                    "number": "3.4",
-                    "title": "Chapter 3 Section 4",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "3.4.3.4",
-                            "page": 124,
-                            "title": "3.4.3.4 Implement Ongoing",
-                        }
-                    ],
-                },
-                {
-                    "id": 8,
-                    "number": "3.5",
-                    "title": "TAILORING THE PERFORMANCE",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "3.5",
-                            "page": 125,
-                            "title": "3.5 TAILORING THE PERFORMANCE",
-                        }
-                    ],
-                },
-                {
-                    "id": 9,
-                    "number": "3.6",
-                    "title": "Chapter 3 Section 6",
-                    "count": 1,
-                    "subsections": [{"section": "3.6", "page": 40, "title": "3.6"}],
-                },
-                {
-                    "id": 10,
-                    "number": "4.1",
-                    "title": "Chapter 4 Section 1",
-                    "count": 1,
-                    "subsections": [{"section": "4.1", "page": 21, "title": "4.1"}],
-                },
-                {
-                    "id": 11,
-                    "number": "4.2",
-                    "title": "Chapter 4 Section 2",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "4.2.6.2",
-                            "page": 144,
-                            "title": "4.2.6.2 Drexler/Sibbet Team Performance",
-                        }
-                    ],
-                },
-                {
-                    "id": 12,
-                    "number": "4.4",
-                    "title": "Chapter 4 Section 4",
-                    "count": 1,
-                    "subsections": [
-                        {"section": "4.4.3", "page": 155, "title": "4.4.3 MEETINGS AND"}
-                    ],
-                },
-                {
-                    "id": 13,
-                    "number": "4.5",
-                    "title": "METHODS APPLIED ACROSS",
-                    "count": 1,
-                    "subsections": [
-                        {
-                            "section": "4.5",
-                            "page": 158,
-                            "title": "4.5 METHODS APPLIED ACROSS",
-                        }
-                    ],
-                },
-                {
-                    "id": 14,
-                    "number": "4.6",
-                    "title": "Chapter 4 Section 6",
-                    "count": 1,
-                    "subsections": [
-                        {"section": "4.6.9", "page": 168, "title": "4.6.9 OTHER"}
-                    ],
-                },
-            ],
-        },
-        "PRINCE2": {
-            "name": "Agile Practices",
-            "icon": "FileText",
-            "color": "cyan",
-            "sections": [
-                {
-                    "id": 1,
-                    "number": "1",
-                    "title": "Agile Mindset and Principles",
-                    "count": 14,
-                    "subsections": [
-                        {"section": "1.1", "page": 8, "title": "The Agile Manifesto"},
-                        {
-                            "section": "1.2",
-                            "page": 12,
-                            "title": "12 Principles Behind the Agile Manifesto",
-                        },
-                        {
-                            "section": "1.3",
-                            "page": 16,
-                            "title": "Values and Principles",
-                        },
-                        {
-                            "section": "1.4",
-                            "page": 20,
-                            "title": "Agile vs Traditional Approaches",
-                        },
-                        {"section": "1.5", "page": 24, "title": "When to Use Agile"},
-                    ],
-                },
-                {
-                    "id": 2,
-                    "number": "2",
-                    "title": "Scrum Framework",
-                    "count": 25,
-                    "subsections": [
-                        {
-                            "section": "2.1",
-                            "page": 32,
-                            "title": "Scrum Theory and Values",
-                        },
-                        {"section": "2.2", "page": 36, "title": "Scrum Team Structure"},
-                        {"section": "2.3", "page": 40, "title": "Product Owner Role"},
-                        {"section": "2.4", "page": 45, "title": "Scrum Master Role"},
-                        {"section": "2.5", "page": 50, "title": "Development Team"},
-                        {"section": "2.6", "page": 55, "title": "Scrum Events"},
-                        {"section": "2.7", "page": 60, "title": "Sprint Planning"},
-                        {"section": "2.8", "page": 65, "title": "Daily Scrum"},
-                    ],
-                },
-                {
-                    "id": 3,
-                    "number": "3",
-                    "title": "Kanban Method",
-                    "count": 16,
-                    "subsections": [
-                        {"section": "3.1", "page": 75, "title": "Kanban Principles"},
-                        {"section": "3.2", "page": 80, "title": "Visualizing Work"},
-                        {
-                            "section": "3.3",
-                            "page": 85,
-                            "title": "Limiting Work in Progress",
-                        },
-                        {"section": "3.4", "page": 90, "title": "Managing Flow"},
-                        {
-                            "section": "3.5",
-                            "page": 95,
-                            "title": "Making Policies Explicit",
-                        },
-                    ],
-                },
-                {
-                    "id": 4,
-                    "number": "4",
-                    "title": "Extreme Programming (XP)",
-                    "count": 19,
-                    "subsections": [
-                        {"section": "4.1", "page": 105, "title": "XP Values"},
-                        {"section": "4.2", "page": 110, "title": "XP Practices"},
-                        {"section": "4.3", "page": 115, "title": "Pair Programming"},
-                        {
-                            "section": "4.4",
-                            "page": 120,
-                            "title": "Test-Driven Development",
-                        },
-                        {
-                            "section": "4.5",
-                            "page": 125,
-                            "title": "Continuous Integration",
-                        },
-                        {"section": "4.6", "page": 130, "title": "Refactoring"},
-                    ],
-                },
-                {
-                    "id": 5,
-                    "number": "5",
-                    "title": "Scaling Agile",
-                    "count": 21,
-                    "subsections": [
-                        {"section": "5.1", "page": 142, "title": "SAFe Framework"},
-                        {"section": "5.2", "page": 148, "title": "LeSS Framework"},
-                        {"section": "5.3", "page": 154, "title": "Disciplined Agile"},
-                        {"section": "5.4", "page": 160, "title": "Nexus Framework"},
-                        {"section": "5.5", "page": 166, "title": "Scrum of Scrums"},
-                    ],
-                },
-            ],
-        },
-        "ISO": {
-            "name": "Leadership & Strategy",
-            "icon": "BookOpen",
-            "color": "purple",
-            "sections": [
-                {
-                    "id": 1,
-                    "number": "1",
-                    "title": "Leadership Fundamentals",
-                    "count": 17,
-                    "subsections": [
-                        {"section": "1.1", "page": 10, "title": "What is Leadership?"},
-                        {
-                            "section": "1.2",
-                            "page": 15,
-                            "title": "Leadership vs Management",
-                        },
-                        {"section": "1.3", "page": 20, "title": "Leadership Styles"},
-                        {
-                            "section": "1.4",
-                            "page": 25,
-                            "title": "Situational Leadership",
-                        },
-                        {
-                            "section": "1.5",
-                            "page": 30,
-                            "title": "Transformational Leadership",
-                        },
-                        {"section": "1.6", "page": 35, "title": "Servant Leadership"},
-                    ],
-                },
-                {
-                    "id": 2,
-                    "number": "2",
-                    "title": "Team Building and Motivation",
-                    "count": 23,
-                    "subsections": [
-                        {
-                            "section": "2.1",
-                            "page": 45,
-                            "title": "Building High-Performance Teams",
-                        },
-                        {
-                            "section": "2.2",
-                            "page": 50,
-                            "title": "Team Development Stages",
-                        },
-                        {"section": "2.3", "page": 55, "title": "Motivation Theories"},
-                        {
-                            "section": "2.4",
-                            "page": 60,
-                            "title": "Maslow's Hierarchy of Needs",
-                        },
-                        {
-                            "section": "2.5",
-                            "page": 65,
-                            "title": "Herzberg's Two-Factor Theory",
-                        },
-                        {
-                            "section": "2.6",
-                            "page": 70,
-                            "title": "McGregor's Theory X and Y",
-                        },
-                        {"section": "2.7", "page": 75, "title": "Conflict Resolution"},
-                    ],
-                },
-                {
-                    "id": 3,
-                    "number": "3",
-                    "title": "Strategic Thinking",
-                    "count": 19,
-                    "subsections": [
-                        {
-                            "section": "3.1",
-                            "page": 88,
-                            "title": "Strategic Planning Process",
-                        },
-                        {"section": "3.2", "page": 94, "title": "SWOT Analysis"},
-                        {
-                            "section": "3.3",
-                            "page": 100,
-                            "title": "Porter's Five Forces",
-                        },
-                        {"section": "3.4", "page": 106, "title": "Balanced Scorecard"},
-                        {"section": "3.5", "page": 112, "title": "OKRs and KPIs"},
-                    ],
-                },
-                {
-                    "id": 4,
-                    "number": "4",
-                    "title": "Communication and Influence",
-                    "count": 20,
-                    "subsections": [
-                        {
-                            "section": "4.1",
-                            "page": 125,
-                            "title": "Effective Communication",
-                        },
-                        {"section": "4.2", "page": 130, "title": "Active Listening"},
-                        {
-                            "section": "4.3",
-                            "page": 135,
-                            "title": "Stakeholder Management",
-                        },
-                        {"section": "4.4", "page": 140, "title": "Negotiation Skills"},
-                        {
-                            "section": "4.5",
-                            "page": 145,
-                            "title": "Influence Without Authority",
-                        },
-                        {"section": "4.6", "page": 150, "title": "Presentation Skills"},
-                    ],
-                },
+    options = SearchOptions.from_body(body)
+    index = await wait_for_indexes()
+    check_options(options, index)
+    await check_granularity(query, options, index)
+
+    started = time.perf_counter()
+    generation = index.generation
+    cache_key = canonical_query(query, options)
+    content, cache_status = lookup_response(cache_key, generation)
+    ticket = None
+    if content is None:
+        # Shed before the 200 goes out; the slot itself is held while streaming
+        try:
+            ticket = admission.enter()
+        except Overloaded:
+            return overloaded()
+
+    async def frames():
+        level = FULL
+        try:
+            if content is not None:
+                books = json.loads(content)
+                for key, book in books.items():
+                    yield ndjson_frame({"type": "book", "key": key, "book": book})
+            else:
+                books = new_structure(index, options.books, options.granularity)
+                async with ticket:
+                    level = ticket.level
+                    search_options = degraded_options(options, level)
+                    async for key, sections in search_as_completed(
+                        query,
+                        search_options,
+                        index,
+                        shard_pool=getattr(app.state, "shard_pool", None),
+                    ):
+                        books[key][result_key(options.granularity)] = sections
+                        if options.compact:
+                            books[key]["toc"] = await toc_url(key, index)
+                        yield ndjson_frame({"type": "book", "key": key, "book": books[key]})
+                # Same bytes /data would have produced, so both endpoints share the cache
+                query_cache.put(
+                    canonical_query(query, search_options), generation, render_json(books)
+                )
+
+            yield ndjson_frame(
                 {
-                    "id": 5,
-                    "number": "5",
-                    "title": "Change Management",
-                    "count": 18,
-                    "subsections": [
-                        {
-                            "section": "5.1",
-                            "page": 162,
-                            "title": "Understanding Change",
-                        },
-                        {
-                            "section": "5.2",
-                            "page": 168,
-                            "title": "Kotter's 8-Step Process",
-                        },
-                        {"section": "5.3", "page": 174, "title": "ADKAR Model"},
-                        {
-                            "section": "5.4",
-                            "page": 180,
-                            "title": "Overcoming Resistance",
-                        },
-                        {
-                            "section": "5.5",
-                            "page": 186,
-                            "title": "Leading Through Change",
-                        },
-                    ],
-                },
-            ],
-        },
+                    "type": "summary",
+                    "query": query,
+                    "strict": options.strict,
+                    "cache": cache_status,
+                    "degradation": LEVEL_NAMES[level],
+                    "counts": {
+                        key: len(book[result_key(options.granularity)]) for key, book in books.items()
+                    },
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                }
+            )
+        finally:
+            if ticket is not None:
+                ticket.abandon()  # the client left before the search started
+
+    return ndjson_response(request, frames())
+
+
+@app.get("/suggest")
+async def suggest(prefix: str = "", k: int = 10):
+    """Top-k vocabulary completions for a prefix, most widespread terms first."""
+    index = await wait_for_indexes()
+    suggest_index = getattr(app.state, "suggest", None)
+    if suggest_index is None or suggest_index.generation != index.generation:
+        # Only a request pinned to a generation that was just swapped out
+        suggest_index = await build_suggest(index, getattr(app.state, "shard_pool", None))
+    return {"prefix": prefix, "suggestions": suggest_index.suggest(prefix, k)}
+
+
+@app.websocket("/ws/search")
+async def live_search(websocket: WebSocket):
+    """
+    Search-as-you-type. Send {"query", "strict", "compact", "id"} on every
+    keystroke; each message supersedes (and cancels) the previous one, and
+    only the words that changed are evaluated. Replies with
+    {"type": "result", "id", "data", "reused", "evaluated"}.
+    """
+    await websocket.accept()
+    session = LiveSearchSession(await wait_for_indexes())
+    pending = None
+    errors = set()  # error frames being sent for failed evaluations
+
+    async def send_error(message_id, detail: str, status_code: int):
+        frame = {"type": "error", "id": message_id, "detail": detail, "status": status_code}
+        try:
+            await websocket.send_text(render_json(frame).decode("utf-8"))
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # the client is already gone
+
+    async def evaluate(message: dict):
+        nonlocal session
+        options = SearchOptions.from_body(message)
+        index = registry.snapshot()
+        try:
+            check_options(options, index)
+            if options.granularity == PAGE:
+                raise HTTPException(status_code=422, detail="granularity=page is not available for live search")
+        except HTTPException as e:
+            await send_error(message.get("id"), e.detail, e.status_code)
+            return
+        # Every keystroke is a search like /data: admitted, and degraded under load
+        try:
+            ticket = admission.enter()
+        except Overloaded:
+            await send_error(message.get("id"), "Search is overloaded, retry shortly", 503)
+            return
+        async with ticket:
+            options = degraded_options(options, ticket.level)
+            if (
+                session.index_registry.generation != index.generation
+                or session.books != options.books
+                or session.fields != options.fields
+                or (session.fuzzy, session.max_expansions) != (options.fuzzy, options.max_expansions)
+            ):
+                # Indexes were hot-swapped, or other books / fields / fuzzy
+                # settings apply; the session's memo only covers the old ones
+                session = LiveSearchSession(
+                    index,
+                    books=options.books,
+                    fields=options.fields,
+                    fuzzy=options.fuzzy,
+                    max_expansions=options.max_expansions,
+                )
+            result = await session.update(message.get("query") or "", options)
+        await finalize(result["data"], options, index)
+        frame = dict(result, type="result", id=message.get("id"), degradation=LEVEL_NAMES[ticket.level])
+        await websocket.send_text(render_json(frame).decode("utf-8"))
+
+    def report_failure(message_id, task: asyncio.Task):
+        # Superseded evaluations are cancelled on purpose; anything else is a bug
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"⚠️ Live search failed: {task.exception()!r}")
+        sending = asyncio.create_task(send_error(message_id, "Search failed", 500))
+        errors.add(sending)
+        sending.add_done_callback(errors.discard)
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if pending is not None and not pending.done():
+                pending.cancel()
+            pending = asyncio.create_task(evaluate(message))
+            pending.add_done_callback(functools.partial(report_failure, message.get("id")))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+@app.get("/books")
+async def list_books():
+    """The book catalog: response keys, display metadata and which shards are loaded."""
+    index = await wait_for_indexes()
+    loaded = set(index.shards.loaded())
+    return {
+        "generation": index.generation,
+        "books": [
+            dict(book.meta(), key=book.key, page_offset=book.page_offset, loaded=book.base_name in loaded)
+            for book in index.books
+        ],
     }
-    
 
+
+# (generation, response key) → (content hash, serialized manifest)
+toc_manifests: dict[tuple[str, str], tuple[str, bytes]] = {}
+# toc_manifest runs in worker threads; builds happen outside the lock
+toc_manifests_lock = threading.Lock()
+
+
+def toc_manifest(key: str, index: IndexGeneration) -> tuple[str, bytes]:
+    generation = index.generation
+    with toc_manifests_lock:
+        cached = toc_manifests.get((generation, key))
+    if cached is None:
+        base_name = dict(book_targets(index))[key]
+        content = render_json(build_toc_manifest(index.get(base_name)))
+        cached = (hashlib.sha256(content).hexdigest()[:32], content)
+        with toc_manifests_lock:
+            # Indexes were swapped: drop manifests of generations nobody asks for
+            live = {generation, registry.generation}
+            for stale in [k for k in toc_manifests if k[0] not in live]:
+                del toc_manifests[stale]
+            cached = toc_manifests.setdefault((generation, key), cached)
+    return cached
+
+
+@app.get("/books/{book}/toc")
+async def get_toc(book: str, request: Request, v: Optional[str] = None):
+    """
+    Section id → title / cleaned title / page for one book. Clients resolve
+    compact /data results against it; the ?v= URL handed out by compact
+    responses is immutable and may be cached forever.
+    """
+    index = await wait_for_indexes()
+    targets = book_targets(index)
+    key = next((k for k, name in targets if book in (k, name)), None)
+    if key is None:
+        raise HTTPException(status_code=404, detail=f"Unknown book '{book}'")
+
+    # May have to load the book's shard, so keep it off the event loop
+    version, content = await asyncio.to_thread(toc_manifest, key, index)
+    cache_control = "public, max-age=0, must-revalidate"
+    if v == version:
+        cache_control = "public, max-age=31536000, immutable"
+    headers = {"ETag": representation_etag(request, version), "Cache-Control": cache_control}
+
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+    return json_response(request, content, headers=headers)
@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional
+
+from book_catalog import BookSpec
+from index_registry import BookShard, IndexRegistry, load_shard
+
+
+# The book owned by this worker process (set by _init_worker)
+_worker_shard: Optional[BookShard] = None
+
+
+def _init_worker(
+    spec: BookSpec,
+    index_folder: str,
+    final_index_folder: str,
+    packed_folder: Optional[str],
+    expected_fingerprint: str,
+):
+    global _worker_shard
+    _worker_shard = load_shard(
+        spec,
+        Path(index_folder),
+        Path(final_index_folder),
+        Path(packed_folder) if packed_folder else None,
+    )
+    if _worker_shard.fingerprint != expected_fingerprint:
+        # Fails the executor (BrokenProcessPool) instead of serving the wrong book
+        raise RuntimeError(f"Shard worker for {spec.base_name} loaded a different index")
+
+
+def _search_in_worker(query: str, options, deadline_at: Optional[float] = None):
+    # Imported lazily so the parent's runner module isn't a dependency cycle
+    from deadline import Deadline
+    from runner import search_book
+
+    deadline = Deadline(deadline_at)
+    sections = search_book(_worker_shard, query, options, deadline)
+    return sections, bool(deadline.truncated)
+
+
+def _ping_worker() -> str:
+    return _worker_shard.fingerprint
+
+
+def _search_batch_in_worker(items):
+    from runner import search_book_batch
+
+    return search_book_batch(_worker_shard, items)
+
+
+class ShardWorkerPool:
+    """
+    Scatter-gather search across long-lived worker processes.
+
+    Every book shard is owned by its own single-process executor, so fuzzy
+    searches for different books run on different cores instead of sharing
+    one interpreter's GIL. The parent only dispatches queries and merges the
+    per-book ``build_amt_structure`` outputs. A book's worker is started the
+    first time that book is searched.
+    """
+
+    def __init__(self, index_registry: IndexRegistry):
+        # Usually a pinned IndexGeneration: a pool serves exactly one generation
+        self.index_registry = index_registry
+        self.generation = index_registry.generation
+        self._context = multiprocessing.get_context("spawn")
+        self._executors: Dict[str, ProcessPoolExecutor] = {}
+        self.ready = False
+        self.retired = False
+
+    def _spawn(self, base_name: str) -> ProcessPoolExecutor:
+        index = self.index_registry
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(
+                index.spec(base_name),
+                str(index.index_folder),
+                str(index.final_index_folder),
+                index.packed_folder and str(index.packed_folder),
+                index.fingerprints[base_name],
+            ),
+        )
+
+    def _executor(self, base_name: str) -> ProcessPoolExecutor:
+        if base_name not in self._executors:
+            self._executors[base_name] = self._spawn(base_name)
+        return self._executors[base_name]
+
+    async def start(self):
+        """Accept searches; each book's worker starts on its first search."""
+        self.ready = True
+        print(f"🧵 Shard workers on demand → {', '.join(self.index_registry.names())}")
+
+    async def warm(self, base_name: str):
+        """Start a book's worker (which loads its shard) now instead of on its first search."""
+        await self._submit(base_name, _ping_worker)
+
+    async def _submit(self, base_name: str, fn, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor(base_name), fn, *args)
+        except BrokenProcessPool:
+            # A crashed worker takes only its own book down; respawn and retry once
+            print(f"⚠️ Shard worker for {base_name} died, restarting...")
+            self._executors[base_name] = self._spawn(base_name)
+            return await loop.run_in_executor(self._executors[base_name], fn, *args)
+
+    def serves(self, generation: str) -> bool:
+        """
+        Whether a search pinned to ``generation`` may be sent to these workers.
+        Callers must submit right after checking (no await in between).
+        """
+        return self.ready and not self.retired and generation == self.generation
+
+    async def search_book(self, base_name: str, query: str, options, deadline=None):
+        deadline_at = deadline.at if deadline is not None else None
+        sections, truncated = await self._submit(
+            base_name, _search_in_worker, query, options, deadline_at
+        )
+        if truncated:
+            deadline.truncated.add(base_name)
+        return sections
+
+    async def search_book_batch(self, base_name: str, items):
+        return await self._submit(base_name, _search_batch_in_worker, items)
+
+    def shutdown(self):
+        self.ready = False
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+    async def retire(self):
+        """
+        Stop taking new searches, let the ones already submitted finish, then
+        stop the workers (and free their copy of the old generation).
+        """
+        self.retired = True
+        executors = list(self._executors.values())
+        await asyncio.gather(
+            *(asyncio.to_thread(executor.shutdown, wait=True) for executor in executors)
+        )
+        self.ready = False
+        self._executors.clear()
@@ -0,0 +1,76 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from index_registry import BookShard, IndexRegistry
+from runner import book_targets
+
+
+class SuggestIndex:
+    """
+    Prefix autocomplete over the vocabulary of every searched book.
+
+    Surface words from each book's ``stem_lookup`` are ranked once, by their
+    stem's section document frequency (how many sections across all books
+    contain it), then shorter and alphabetical first. Walking that order,
+    every prefix of every word collects its best ``MAX_K`` words, one per
+    stem, so a lookup is a dict get and a slice. The vocabulary is a few
+    thousand words, so all prefixes together stay small.
+    """
+
+    MAX_K = 20
+
+    def __init__(self, word_stems: Dict[str, str], df: Dict[str, int], generation: str = ""):
+        self.generation = generation
+        self.df = df
+        self.words: List[str] = sorted(
+            word_stems, key=lambda w: (-df.get(word_stems[w], 0), len(w), w)
+        )
+        self.stems: List[str] = [word_stems[w] for w in self.words]
+
+        top: Dict[str, List[int]] = defaultdict(list)
+        seen: Dict[str, set] = defaultdict(set)
+        for position, word in enumerate(self.words):
+            stem = self.stems[position]
+            for length in range(1, len(word) + 1):
+                prefix = word[:length]
+                best = top[prefix]
+                if len(best) < self.MAX_K and stem not in seen[prefix]:
+                    best.append(position)
+                    seen[prefix].add(stem)
+        # prefix → positions of its best words, best first
+        self._top: Dict[str, Tuple[int, ...]] = {
+            prefix: tuple(positions) for prefix, positions in top.items()
+        }
+
+    @classmethod
+    def build(
+        cls, index_registry: IndexRegistry, load: Optional[Callable[[str], BookShard]] = None
+    ) -> "SuggestIndex":
+        """
+        Vocabulary of every searched book. ``load`` fetches a book's shard
+        (default: ``index_registry.get``, which keeps it loaded).
+        """
+        load = load or index_registry.get
+        word_stems: Dict[str, str] = {}
+        df: Dict[str, int] = defaultdict(int)
+        for _, base_name in book_targets(index_registry):
+            indexer = load(base_name).indexer
+            word_stems.update(indexer.stem_lookup)
+            for stem, books in indexer.index.items():
+                df[stem] += sum(len(sections) for sections in books.values())
+        return cls(word_stems, dict(df), index_registry.generation)
+
+    def suggest(self, prefix: str, k: int = 10) -> List[dict]:
+        prefix = prefix.strip().lower()
+        k = max(1, min(k, self.MAX_K))
+        if not prefix:
+            return []
+
+        return [
+            {
+                "term": self.words[p],
+                "stem": self.stems[p],
+                "df": self.df.get(self.stems[p], 0),
+            }
+            for p in self._top.get(prefix, ())[:k]
+        ]
@@ -0,0 +1,73 @@
+import pickle
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+# Backend modules are imported flat, as the server and scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from book_catalog import BookSpec  # noqa: E402
+from index_registry import IndexRegistry  # noqa: E402
+from search_engine import SearchEngine, porter_stem  # noqa: E402
+from tokens import section_text, words  # noqa: E402
+
+BOOKS = {
+    "book1": {
+        "1": {"title": "Introduction", "content": "Why projects plan for risk."},
+        "1.1": {"title": "Risk register", "content": "Every risk has an owner and a response."},
+        "2": {"title": "Scope", "content": "Scope baseline and scope creep."},
+        "2.1": {"title": "Issue log", "content": "Issues are tracked separately from risk."},
+    },
+}
+
+# Catalog entry for the fixture book, as config.BOOKS describes real ones
+BOOK_SPECS = [BookSpec(key="Book1", index_file="book1_index.pkl", name="Book 1")]
+
+
+def build_data(books: dict) -> dict:
+    """An index dict over in-memory books, as create_index pickles it (without optional blocks)."""
+    index = defaultdict(lambda: defaultdict(list))
+    stem_lookup = {}
+    for book, sections in books.items():
+        for sid, section in sections.items():
+            for word in set(words(section_text(section))):
+                stem_lookup[word] = porter_stem(word)
+                index[stem_lookup[word]][book].append(sid)
+    return {
+        "books": books,
+        "index": {stem: dict(found) for stem, found in index.items()},
+        "stem_lookup": stem_lookup,
+    }
+
+
+def build_engine(books: dict) -> SearchEngine:
+    """A SearchEngine over in-memory books, indexed like create_index does it."""
+    engine = SearchEngine()
+    engine.load_data(build_data(books))
+    return engine
+
+
+@pytest.fixture
+def engine() -> SearchEngine:
+    return build_engine(BOOKS)
+
+
+def write_index_tree(root: Path, books: dict = BOOKS) -> Path:
+    """``index`` / ``final_index`` folders holding the fixture book, laid out like Data/."""
+    (root / "index").mkdir(parents=True)
+    (root / "final_index").mkdir()
+    (root / "index" / "book1_index.pkl").write_bytes(pickle.dumps(build_data(books)))
+    return root
+
+
+@pytest.fixture
+def index_tree(tmp_path) -> Path:
+    return write_index_tree(tmp_path / "data")
+
+
+@pytest.fixture
+def index_registry(index_tree) -> IndexRegistry:
+    """A registry serving the fixture book from ``index_tree`` (pickle mode)."""
+    return IndexRegistry(index_tree / "index", index_tree / "final_index", books=BOOK_SPECS)
@@ -0,0 +1,44 @@
+import itertools
+
+import pytest
+
+from bitmap_postings import BitmapPostings, bit_positions, to_bitmap
+
+
+@pytest.mark.parametrize("positions", [[], [0], [1, 2, 3], [0, 63, 64, 65, 1000]])
+def test_positions_round_trip_through_a_bitmap(positions):
+    assert list(bit_positions(to_bitmap(positions))) == positions
+
+
+def test_section_ids_round_trip_through_the_fixture_postings(engine):
+    postings = engine.field_postings()
+    for stem, books in engine.index.items():
+        for book, section_ids in books.items():
+            bits = postings.get(stem)[book]
+            assert postings.decode(book, bits) == sorted(set(section_ids))
+            assert postings.encode(book, section_ids) == bits
+    assert postings.get("nosuchstem") == {}
+
+
+def test_bitwise_operations_match_set_operations(engine):
+    postings = engine.field_postings()
+    for book, section_ids in postings.sections.items():
+        everything = set(section_ids)
+        universe = (1 << len(section_ids)) - 1
+        stems = [stem for stem, books in engine.index.items() if book in books]
+        for a, b in itertools.product(stems, repeat=2):
+            bits_a, bits_b = postings.get(a)[book], postings.get(b)[book]
+            set_a, set_b = set(engine.index[a][book]), set(engine.index[b][book])
+            assert postings.decode(book, bits_a & bits_b) == sorted(set_a & set_b)
+            assert postings.decode(book, bits_a | bits_b) == sorted(set_a | set_b)
+            assert postings.decode(book, bits_a & ~bits_b) == sorted(set_a - set_b)
+        for stem in stems:
+            not_stem = universe & ~postings.get(stem)[book]
+            assert postings.decode(book, not_stem) == sorted(everything - set(engine.index[stem][book]))
+
+
+def test_shared_numbering_lets_bitmaps_mix():
+    first = BitmapPostings({"a": {"book": ["2", "1"]}})
+    second = BitmapPostings({"b": {"book": ["2"]}}, first.sections)
+    both = first.get("a")["book"] & second.get("b")["book"]
+    assert first.decode("book", both) == ["2"]
@@ -0,0 +1,39 @@
+import difflib
+
+from conftest import build_engine
+from fuzzy_index import FuzzyIndex
+
+VOCABULARY = [
+    "project", "projects", "projection", "internationalization",
+    "register", "risk", "risks", "brisk", "frisk", "rise", "disk",
+]
+
+
+def test_distance_one_and_two_are_found():
+    fuzzy = FuzzyIndex(VOCABULARY, max_distance=2)
+    # One insertion away, and two
+    assert fuzzy.close_matches("projec") == ["project", "projects"]
+    assert fuzzy.close_matches("projt") == ["project"]
+
+
+def test_distance_three_is_rejected_even_when_difflib_accepts_it():
+    fuzzy = FuzzyIndex(VOCABULARY, max_distance=2)
+    word = "internationalizat"  # three deletions from "internationalization"
+    assert difflib.get_close_matches(word, VOCABULARY, cutoff=0.8) == ["internationalization"]
+    assert fuzzy.close_matches(word) == []
+    assert "internationalization" not in fuzzy.candidates(word)
+
+
+def test_matches_are_ranked_like_difflib_and_capped():
+    fuzzy = FuzzyIndex(VOCABULARY, max_distance=2)
+    assert fuzzy.close_matches("risk", n=5) == difflib.get_close_matches("risk", VOCABULARY, 5, 0.8)
+    assert fuzzy.close_matches("risk", n=2) == ["risk", "risks"]
+    assert fuzzy.close_matches("risk", n=0) == []
+
+
+def test_max_expansions_caps_the_engine_expansion():
+    engine = build_engine({"book": {"1": {"title": "Plans", "content": "A planet, a plant, a planer and a plane."}}})
+    assert engine.expand("plan") == ["plan", "plan", "plant", "plane", "planet", "planer"]
+    assert engine.expand("plan", max_expansions=2) == ["plan", "plan", "plant"]
+    assert engine.expand("plan", max_expansions=0) == ["plan"]
+    assert engine.expand("plan", fuzzy=False) == ["plan"]
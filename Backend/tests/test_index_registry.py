@@ -0,0 +1,50 @@
+import copy
+
+from conftest import BOOK_SPECS, BOOKS, write_index_tree
+from generations import READY_MARKER
+from index_registry import IndexRegistry
+
+
+def publish_generation(generations, name: str, books: dict = BOOKS, ready: bool = True):
+    """A generation directory as generations.publish lays it out, named ``name``."""
+    write_index_tree(generations / name, books)
+    if ready:
+        (generations / name / READY_MARKER).touch()
+    return generations / name
+
+
+def test_load_newer_hot_swaps_a_published_generation(tmp_path):
+    generations = tmp_path / "generations"
+    publish_generation(generations, "20260101T000000Z")
+    registry = IndexRegistry(
+        tmp_path / "unused", tmp_path / "unused", generations_folder=generations, books=BOOK_SPECS
+    ).load_all()
+    serving = registry.generation
+    assert registry.status()["source"] == "20260101T000000Z"
+    assert registry.load_newer() is None  # nothing newer yet
+
+    books = copy.deepcopy(BOOKS)
+    books["book1"]["3"] = {"title": "Closing", "content": "Lessons learned."}
+    publish_generation(generations, "20260102T000000Z", books)
+    candidate = registry.load_newer()
+    assert candidate is not None
+    registry.swap(candidate)
+
+    assert registry.generation != serving
+    assert registry.status()["source"] == "20260102T000000Z"
+    assert "3" in registry.get("book1").indexer.get_all_section_ids()
+
+
+def test_generation_without_ready_marker_is_ignored(tmp_path):
+    generations = tmp_path / "generations"
+    publish_generation(generations, "20260101T000000Z")
+    registry = IndexRegistry(
+        tmp_path / "unused", tmp_path / "unused", generations_folder=generations, books=BOOK_SPECS
+    ).load_all()
+    serving = registry.generation
+
+    # Still being copied: newer by name, but not marked READY
+    publish_generation(generations, "20260102T000000Z", ready=False)
+    assert registry.load_newer() is None
+    assert registry.generation == serving
+    assert registry.status()["source"] == "20260101T000000Z"
@@ -0,0 +1,92 @@
+import pickle
+import sys
+
+import pytest
+
+from conftest import BOOK_SPECS, BOOKS, build_data, build_engine
+from index_registry import IndexRegistry
+from packed_index import FORMAT_VERSION, PackedIndex, open_packed
+from search_engine import SearchEngine
+
+
+@pytest.fixture
+def mapped(tmp_path) -> SearchEngine:
+    index_path = tmp_path / "book1_index.pkl"
+    index_path.write_bytes(pickle.dumps(build_data(BOOKS)))
+    engine = SearchEngine()
+    engine.load_mapped(open_packed(index_path, None, tmp_path / "packed"))
+    return engine
+
+
+def test_bm25_stats_are_stored(mapped):
+    expected = build_engine(BOOKS).bm25_stats()
+    stats = mapped.bm25
+    assert stats is not None  # no rebuild from the section text on first ranked query
+    assert {stem: stats.term_freqs[stem] for stem in stats.term_freqs} == expected.term_freqs
+    assert stats.section_lengths == expected.section_lengths
+
+
+def test_ranked_results_match_pickle(mapped):
+    engine = build_engine(BOOKS)
+    for query in ("risk", "scope risk", "risk owner response"):
+        assert mapped.search2(query, top_k=3) == engine.search2(query, top_k=3)
+
+
+def test_positions_are_stored(mapped):
+    expected = build_engine(BOOKS).positional_index()
+    positions = mapped.positional.positions
+    assert {stem: positions[stem] for stem in positions} == expected.positions
+
+
+def test_phrase_results_match_pickle(mapped):
+    engine = build_engine(BOOKS)
+    for query in ('"risk register"', '"scope creep"', "risk NEAR/3 owner"):
+        assert mapped.search2(query) == engine.search2(query)
+
+
+def test_title_stats_are_stored(mapped):
+    expected = build_engine(BOOKS).title_field().bm25
+    stats = mapped.title.bm25
+    assert {stem: stats.term_freqs[stem] for stem in stats.term_freqs} == expected.term_freqs
+    assert stats.section_lengths == expected.section_lengths
+
+
+def test_title_results_match_pickle(mapped):
+    engine = build_engine(BOOKS)
+    for query in ("risk", "scope", "introductio"):
+        assert mapped.search2(query, fields="title") == engine.search2(query, fields="title")
+
+
+def test_stale_format_is_repacked(tmp_path):
+    data = build_data(BOOKS)
+    data["page_postings"] = {"risk": {"book1": (1, 3)}}
+    index_path = tmp_path / "book1_index.pkl"
+    index_path.write_bytes(pickle.dumps(data))
+    packed_path = open_packed(index_path, None, tmp_path / "packed").path
+
+    # A file from before page postings were packed: same sources, older layout
+    raw = bytearray(packed_path.read_bytes())
+    raw[4:8] = (FORMAT_VERSION - 1).to_bytes(4, sys.byteorder)
+    stale_path = tmp_path / "stale.pmix"
+    stale_path.write_bytes(bytes(raw))
+    stale_path.replace(packed_path)
+
+    engine = SearchEngine()
+    engine.load_mapped(open_packed(index_path, None, tmp_path / "packed"))
+    assert engine.search_pages("risk") == {"book1": [1, 3]}
+
+
+def test_main_packs_every_catalogued_book(index_tree, monkeypatch):
+    import index_registry
+    import packed_index
+
+    packed_folder = index_tree / "packed"
+    registry = IndexRegistry(
+        index_tree / "index", index_tree / "final_index", packed_folder, books=BOOK_SPECS
+    )
+    monkeypatch.setattr(index_registry, "registry", registry)
+    packed_index.main()
+
+    engine = SearchEngine()
+    engine.load_mapped(PackedIndex(packed_folder / "book1_index.pmix"))
+    assert engine.search2("risk") == build_engine(BOOKS).search2("risk")
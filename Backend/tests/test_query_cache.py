@@ -0,0 +1,41 @@
+import query_cache
+from query_cache import QueryCache
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl_seconds=60.0)
+    cache.put("q", "g1", b"body")
+
+    now[0] += 59.0
+    assert cache.get("q", "g1") == b"body"
+    now[0] += 2.0
+    assert cache.get("q", "g1") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_at_the_bound():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", "g1", b"A")
+    cache.put("b", "g1", b"B")
+    assert cache.get("a", "g1") == b"A"  # "b" is now the least recently used
+
+    cache.put("c", "g1", b"C")
+    assert cache.get("b", "g1") is None
+    assert cache.get("a", "g1") == b"A"
+    assert cache.get("c", "g1") == b"C"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_a_new_generation_misses_and_drops_the_old_entries():
+    cache = QueryCache()
+    cache.put("q", "g1", b"old")
+    assert cache.get("q", "g1") == b"old"
+
+    assert cache.get("q", "g2") is None
+    assert cache.stats()["invalidations"] == 1
+    # Going back does not resurrect results computed for the old index
+    assert cache.get("q", "g1") is None
@@ -0,0 +1,37 @@
+from query_planner import compile_query, possible_books
+from search_engine import porter_stem
+
+NAMES = {"PMBook": {"pmbook", "book1"}, "ISO": {"iso", "book3"}}
+
+
+def test_juxtaposed_filter_constrains_or_query():
+    tree = compile_query("risk book:PMBook", porter_stem)
+    assert tree == ("and", "risk", ("book", "pmbook"))
+    assert possible_books(tree, NAMES) == {"PMBook"}
+
+
+def test_filter_constrains_whole_group():
+    tree = compile_query("book:PMBook risk scope", porter_stem)
+    assert tree == ("and", ("book", "pmbook"), ("or", "risk", "scope"))
+
+
+def test_explicit_or_with_filter_is_kept():
+    tree = compile_query("risk OR book:ISO", porter_stem)
+    assert tree == ("or", "risk", ("book", "iso"))
+    assert possible_books(tree, NAMES) == {"PMBook", "ISO"}
+
+
+def test_lower_case_or_is_not_a_term():
+    tree = compile_query("(risk or issue) AND plan", porter_stem, match_all=True)
+    assert tree == ("and", "issu", "plan", "risk")
+
+
+def test_lower_case_and_not_are_plain_words():
+    tree = compile_query("risk and not scope", porter_stem)
+    assert tree == ("or", "and", "not", "risk", "scope")
+
+
+def test_filter_and_semantics_in_search(engine):
+    both = engine.search2("risk book:PMBook", book_names=("PMBook",))
+    assert both == engine.search2("risk")
+    assert engine.search2("risk book:ISO", book_names=("PMBook",)) == {}
@@ -0,0 +1,16 @@
+def test_or_keeps_matches_when_first_word_misses(engine):
+    # Regression: seeding from an unmatched first word emptied OR queries
+    assert engine.search2("zzqx risk", fuzzy=False) == engine.search2("risk", fuzzy=False)
+    assert engine.search2("zzqx risk", fuzzy=False)["book1"]
+
+
+def test_and_with_unmatched_word_is_empty(engine):
+    assert engine.search2("zzqx risk", match_all=True, fuzzy=False) == {}
+    assert engine.search2("risk zzqx", match_all=True, fuzzy=False) == {}
+
+
+def test_search_many_matches_search2(engine):
+    queries = [("zzqx risk", False), ("risk scope", True), ("issue", False)]
+    assert engine.search_many(queries, fuzzy=False) == [
+        engine.search2(query, match_all=match_all, fuzzy=False) for query, match_all in queries
+    ]
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import runner
+import server
+from admission import AdmissionController
+from deadline import Deadline
+from query_cache import QueryCache
+
+
+@pytest.fixture
+def admission(monkeypatch) -> AdmissionController:
+    # One search at a time and room for one more in the queue
+    controller = AdmissionController(1, 1, 8, 32, 300.0, 1000.0)
+    monkeypatch.setattr(server, "admission", controller)
+    return controller
+
+
+@pytest.fixture
+def client(index_registry, admission, tmp_path, monkeypatch):
+    """The app serving the fixture book, with fresh caches and no reload polling."""
+    monkeypatch.setattr(server, "registry", index_registry)
+    monkeypatch.setattr(server, "query_cache", QueryCache())
+    monkeypatch.setattr(server, "RELOAD_POLL_SECONDS", 0)
+    monkeypatch.setattr(server, "PRECOMPUTED_STORE_PATH", str(tmp_path / "none.sqlite3"))
+    with TestClient(server.app) as client:
+        client.get("/data", params={"query": "warm"})  # waits for the warm-up
+        yield client
+
+
+def test_stream_is_shed_when_the_queue_is_full(client, admission):
+    queued = admission.enter()  # takes the only queue place
+    try:
+        response = client.post("/data/stream", json={"query": "scope"})
+        assert response.status_code == 503
+        assert admission.waiting == 1
+    finally:
+        queued.abandon()
+    response = client.post("/data/stream", json={"query": "scope"})
+    assert response.status_code == 200
+    assert admission.waiting == 0
+
+
+def test_degradation_level_is_always_reported(client, admission):
+    response = client.post("/data", json={"query": "risk"})
+    assert response.headers["X-Degradation-Level"] == "0"
+    assert response.headers["X-Degradation"] == "none"
+    # Answered from the query cache: still full quality, still reported
+    response = client.post("/data", json={"query": "risk"})
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.headers["X-Degradation"] == "none"
+
+    admission.latencies.extend([5000.0] * 20)  # p95 far above SEVERE_P95_MS
+    response = client.post("/data", json={"query": "scope"})
+    assert response.headers["X-Degradation-Level"] == "2"
+    assert response.headers["X-Degradation"] == "exact-only"
+
+
+def test_live_search_goes_through_admission(client, admission):
+    with client.websocket_connect("/ws/search") as websocket:
+        websocket.send_json({"id": 1, "query": "scope"})
+        frame = websocket.receive_json()
+        assert frame["type"] == "result"
+        assert frame["degradation"] == "none"
+
+        admission.latencies.extend([5000.0] * 20)
+        websocket.send_json({"id": 2, "query": "scope"})
+        assert websocket.receive_json()["degradation"] == "exact-only"
+
+        queued = admission.enter()  # takes the only queue place
+        try:
+            websocket.send_json({"id": 3, "query": "scope"})
+            frame = websocket.receive_json()
+            assert frame == {
+                "type": "error",
+                "id": 3,
+                "detail": "Search is overloaded, retry shortly",
+                "status": 503,
+            }
+        finally:
+            queued.abandon()
+    assert admission.waiting == 0
+
+
+def test_live_search_failures_are_reported(client, monkeypatch):
+    async def fail(self, query, options):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server.LiveSearchSession, "update", fail)
+    with client.websocket_connect("/ws/search") as websocket:
+        websocket.send_json({"id": 7, "query": "scope"})
+        frame = websocket.receive_json()
+        assert frame["type"] == "error"
+        assert frame["id"] == 7
+        assert frame["status"] == 500
+
+
+@pytest.fixture
+def slow_books(monkeypatch):
+    """Book searches that take far longer than a tiny deadline."""
+    search_named_book = runner.search_named_book
+
+    def slow(*args):
+        time.sleep(0.3)
+        return search_named_book(*args)
+
+    monkeypatch.setattr(runner, "search_named_book", slow)
+
+
+def test_deadline_truncates_and_is_never_cached(client, slow_books):
+    cache = server.query_cache
+    cached = cache.stats()["size"]  # the fixture's warm-up query
+    response = client.post("/data", json={"query": "scope", "deadline_ms": 1})
+    assert response.status_code == 200
+    assert response.headers["X-Search-Truncated"] == "true"
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+    assert all(book["truncated"] for book in response.json().values())
+    assert cache.stats()["size"] == cached
+
+    # The same query without a budget is searched again, not served partial
+    response = client.post("/data", json={"query": "scope"})
+    assert response.headers["X-Cache"] == "MISS"
+    assert "X-Search-Truncated" not in response.headers
+    assert cache.stats()["size"] == cached + 1
+
+
+def test_deadline_watch_stops_when_the_client_disconnects():
+    class Gone:
+        async def is_disconnected(self):
+            return True
+
+    deadline = Deadline(request=Gone())
+    asyncio.run(asyncio.wait_for(deadline.watch(), timeout=1))
+    assert deadline.disconnected
+    assert deadline.expired()
@@ -0,0 +1,22 @@
+from suggest import SuggestIndex
+
+WORD_STEMS = {"risk": "risk", "risks": "risk", "right": "right", "rigid": "rigid", "scope": "scope"}
+DF = {"risk": 9, "right": 4, "rigid": 4, "scope": 7}
+
+
+def terms(index, prefix, k=10):
+    return [s["term"] for s in index.suggest(prefix, k)]
+
+
+def test_ranked_by_document_frequency_one_word_per_stem():
+    index = SuggestIndex(WORD_STEMS, DF)
+    assert terms(index, "ri") == ["risk", "right", "rigid"]
+    assert terms(index, "ris") == ["risk"]
+    assert terms(index, "r", k=2) == ["risk", "right"]
+
+
+def test_unknown_or_empty_prefix():
+    index = SuggestIndex(WORD_STEMS, DF)
+    assert terms(index, "xyz") == []
+    assert terms(index, "riskiest") == []
+    assert terms(index, "  ") == []
@@ -0,0 +1,22 @@
+import re
+from typing import Callable, List
+
+# An indexed word: three or more ASCII letters. Section text, page text and
+# queries are all split with this one pattern, so they agree on the terms
+WORD = r'[a-zA-Z]{3,}'
+WORD_PATTERN = re.compile(rf'\b{WORD}\b')
+
+
+def words(text: str) -> List[str]:
+    """Lower-case indexed words of a text, in order."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def section_text(section: dict) -> str:
+    """The text a section is indexed under: its title, then its content."""
+    return f"{section['title']} {section['content']}"
+
+
+def section_tokens(section: dict, stem: Callable[[str], str]) -> List[str]:
+    """A section's stems in text order, tokenized exactly like build_index tokenizes it."""
+    return [stem(word) for word in words(section_text(section))]